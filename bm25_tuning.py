@@ -0,0 +1,209 @@
+"""BM25 参数与字段权重的快速网格调参工具。
+
+只解析一次 HTML，把每个文档 title / p 两个字段的原始词频保存在内存中，
+随后对 k1、b、title 权重的所有组合直接用 NumPy 向量化打分，无需重建索引。
+每组参数报告 nDCG@k、MRR@k 与平均单次查询打分耗时。
+
+标注文件（query → 相关文档ID）支持两种格式：
+
+* JSON：``{"凶": [1], "春天": [27, 20]}``
+* TSV：每行 ``查询<TAB>文档ID,文档ID,...``
+
+用法::
+
+    python -m bm25_tuning judgments.tsv --k1 0.8 1.2 1.6 --b 0.5 0.75 0.9 --title-weight 5 10 20
+
+选定参数后，通过环境变量 ``BM25_K1``、``BM25_B`` 生效；``TITLE_WEIGHT``
+需要重建索引（``python -m search_engine``）后生效。
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from search_engine import (
+    DEFAULT_B,
+    DEFAULT_HTMLS_DIR,
+    DEFAULT_K1,
+    DEFAULT_TITLE_WEIGHT,
+    iter_document_fields,
+    load_stopwords,
+    tokenize,
+)
+
+
+# ---------------------- 标注与字段统计 ----------------------
+def load_judgments(path: str | os.PathLike[str]) -> dict[str, set[int]]:
+    """读取标注文件，返回 {查询: 相关文档ID集合}"""
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() == ".json":
+        return {query: {int(doc_id) for doc_id in doc_ids} for query, doc_ids in json.loads(text).items()}
+
+    judgments: dict[str, set[int]] = {}
+    for line in text.splitlines():
+        if not line.strip() or line.startswith("#"):
+            continue
+        query, _, doc_ids = line.partition("\t")
+        judgments.setdefault(query.strip(), set()).update(
+            int(doc_id) for doc_id in doc_ids.replace("，", ",").split(",") if doc_id.strip()
+        )
+    return judgments
+
+
+class FieldStats:
+    """内存中的逐字段原始词频：每个词一行 (文档序号, title词频, p词频)"""
+
+    def __init__(self, htmls_dir=DEFAULT_HTMLS_DIR, stopwords_path=None, start=1, end=107):
+        doc_ids, title_lens, p_lens = [], [], []
+        postings: dict[str, dict[int, list[int]]] = {}
+        for doc_id, title_words, p_words in iter_document_fields(htmls_dir, stopwords_path, start, end):
+            if not title_words and not p_words:
+                continue  # 与索引构建一致：无有效词的文档不入索引
+            pos = len(doc_ids)
+            doc_ids.append(doc_id)
+            title_lens.append(len(title_words))
+            p_lens.append(len(p_words))
+            for field, words in ((0, title_words), (1, p_words)):
+                for word, count in Counter(words).items():
+                    postings.setdefault(word, {}).setdefault(pos, [0, 0])[field] += count
+
+        self.doc_ids = np.array(doc_ids, dtype=np.int64)
+        # 文档长度为原始词数（不含权重），与 search_engine 一致
+        self.doc_lengths = np.array(title_lens, dtype=np.float64) + np.array(p_lens, dtype=np.float64)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if doc_ids else 0.0
+        self.postings = {
+            word: (
+                np.fromiter(docs.keys(), dtype=np.int64, count=len(docs)),
+                np.array([tf[0] for tf in docs.values()], dtype=np.float64),
+                np.array([tf[1] for tf in docs.values()], dtype=np.float64),
+            )
+            for word, docs in postings.items()
+        }
+
+    @property
+    def total_docs(self) -> int:
+        return len(self.doc_ids)
+
+    def query_matrices(self, query_words):
+        """把查询词展开为稠密矩阵 (词数 × 文档数)：title词频、p词频、IDF、重复次数"""
+        counts = Counter(word for word in query_words if word in self.postings)
+        words = list(counts)
+        n_docs = self.total_docs
+        title_tf = np.zeros((len(words), n_docs))
+        p_tf = np.zeros((len(words), n_docs))
+        idf = np.zeros((len(words), 1))
+        for i, word in enumerate(words):
+            positions, title_counts, p_counts = self.postings[word]
+            title_tf[i, positions] = title_counts
+            p_tf[i, positions] = p_counts
+            df = len(positions)
+            idf[i, 0] = math.log((n_docs - df + 0.5) / (df + 0.5) + 1)
+        repeat = np.array([[counts[word]] for word in words], dtype=np.float64)
+        return title_tf, p_tf, idf * repeat  # 重复的查询词重复计分
+
+
+# ---------------------- 打分与评测 ----------------------
+def score_matrix(title_tf, p_tf, weighted_idf, doc_lengths, avg_len, k1, b, title_weight):
+    """向量化的 BM25：一次算出所有文档的分数"""
+    tf = title_weight * title_tf + p_tf
+    norm = k1 * (1 - b + b * doc_lengths / avg_len)
+    return (weighted_idf * (tf * (k1 + 1)) / (tf + norm)).sum(axis=0)
+
+
+def ndcg_at_k(ranked, relevant, k):
+    dcg = sum(1.0 / math.log2(i + 2) for i, doc_id in enumerate(ranked[:k]) if doc_id in relevant)
+    ideal = sum(1.0 / math.log2(i + 2) for i in range(min(len(relevant), k)))
+    return dcg / ideal if ideal else 0.0
+
+
+def mrr_at_k(ranked, relevant, k):
+    for i, doc_id in enumerate(ranked[:k]):
+        if doc_id in relevant:
+            return 1.0 / (i + 1)
+    return 0.0
+
+
+def sweep(stats, judgments, k1_values, b_values, title_weights, k=10, stopwords_path=None):
+    """评测所有参数组合，按 nDCG 降序返回结果列表"""
+    stopwords = load_stopwords(stopwords_path)
+    prepared = [
+        (stats.query_matrices(tokenize(query, stopwords)), relevant)
+        for query, relevant in judgments.items()
+    ]
+
+    results = []
+    for k1, b, title_weight in itertools.product(k1_values, b_values, title_weights):
+        ndcg_total = mrr_total = 0.0
+        started = time.perf_counter()
+        for (title_tf, p_tf, weighted_idf), relevant in prepared:
+            if not len(weighted_idf):
+                continue
+            scores = score_matrix(
+                title_tf, p_tf, weighted_idf, stats.doc_lengths, stats.avg_doc_length, k1, b, title_weight
+            )
+            order = np.argsort(-scores, kind="stable")[:k]
+            ranked = [int(stats.doc_ids[i]) for i in order if scores[i] > 0]
+            ndcg_total += ndcg_at_k(ranked, relevant, k)
+            mrr_total += mrr_at_k(ranked, relevant, k)
+        elapsed = time.perf_counter() - started
+        n_queries = len(prepared) or 1
+        results.append(
+            {
+                "k1": k1,
+                "b": b,
+                "title_weight": title_weight,
+                "ndcg": ndcg_total / n_queries,
+                "mrr": mrr_total / n_queries,
+                "latency_ms": elapsed * 1000 / n_queries,
+            }
+        )
+    results.sort(key=lambda r: (r["ndcg"], r["mrr"]), reverse=True)
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="BM25 参数与字段权重网格调参")
+    parser.add_argument("judgments", help="标注文件（.json 或 TSV）")
+    parser.add_argument("--htmls-dir", default=DEFAULT_HTMLS_DIR)
+    parser.add_argument("--start", type=int, default=1)
+    parser.add_argument("--end", type=int, default=107)
+    parser.add_argument("--k1", type=float, nargs="+", default=[0.6, 0.9, DEFAULT_K1, 1.5, 2.0])
+    parser.add_argument("--b", type=float, nargs="+", default=[0.3, 0.5, DEFAULT_B, 0.9])
+    parser.add_argument("--title-weight", type=float, nargs="+", default=[1, 5, 10, DEFAULT_TITLE_WEIGHT, 40])
+    parser.add_argument("-k", type=int, default=10, help="nDCG/MRR 截断位置")
+    parser.add_argument("--top", type=int, default=20, help="只显示前N组参数")
+    parser.add_argument("--json", dest="json_path", help="将全部结果另存为 JSON")
+    args = parser.parse_args(argv)
+
+    judgments = load_judgments(args.judgments)
+    started = time.perf_counter()
+    stats = FieldStats(args.htmls_dir, start=args.start, end=args.end)
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = sweep(stats, judgments, args.k1, args.b, args.title_weight, k=args.k)
+    sweep_seconds = time.perf_counter() - started
+
+    print(f"\n{len(judgments)} 条查询，{stats.total_docs} 个文档；"
+          f"解析 {load_seconds:.2f}s，评测 {len(results)} 组参数 {sweep_seconds:.2f}s")
+    print(f"{'k1':>6} {'b':>6} {'title':>6} {'nDCG@' + str(args.k):>9} {'MRR':>7} {'ms/查询':>8}")
+    for r in results[: args.top]:
+        print(f"{r['k1']:>6.2f} {r['b']:>6.2f} {r['title_weight']:>6g} "
+              f"{r['ndcg']:>9.4f} {r['mrr']:>7.4f} {r['latency_ms']:>8.3f}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
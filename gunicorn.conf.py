@@ -0,0 +1,13 @@
+"""Gunicorn settings picked up automatically by ``gunicorn app:app``.
+
+``search_engine`` loads each index once per process and shares it between
+threads, so a few processes with several threads each use far less memory
+than many single-threaded sync workers.
+"""
+
+import os
+
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
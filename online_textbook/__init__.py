@@ -1,15 +1,44 @@
-"""Application factory for the online textbook search site."""
+"""Application factory for the online textbook search site.
+
+Only Flask and the lightweight search modules are imported here; jieba, lxml,
+BeautifulSoup and NumPy are imported on first use (or by the startup preload)
+so that command-line tools and cold starts do not pay for them up front.
+"""
 
 from __future__ import annotations
 
+import time
+
+_IMPORTS_STARTED = time.perf_counter()
+
+import heapq
+import json
 import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any, Iterator
+
+from flask import Flask, abort, current_app, g, render_template, request
 
-from flask import Flask, abort, current_app, render_template, request
-from bs4 import BeautifulSoup
+from search_backends import SearchBackend, open_backend
+from search_engine import (
+    DEFAULT_TOKENIZER_SNAPSHOT,
+    get_tokenizer,
+    load_stopwords,
+    set_index_memory_budget,
+)
+from online_textbook.cache import LRUCache
+from online_textbook.query_log import QueryLogger
 
-from search_engine import retrieve, load_stopwords
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+    from online_textbook.corpora import Corpus
+    from online_textbook.startup import StartupProfile
+    from query_suggest import Suggestion
+
+_IMPORTS_MS = (time.perf_counter() - _IMPORTS_STARTED) * 1000
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -22,9 +51,50 @@ def create_app(config: dict[str, Any] | None = None) -> Flask:
     ----------
     config:
         Optional configuration overrides. Keys include `HTMLS_DIR`,
-        `STOPWORDS_PATH`, and `INDEX_PATH`.
+        `STOPWORDS_PATH`, `INDEX_PATH`, `SEARCH_BACKEND` (`"bm25"`,
+        `"sqlite"` or `"sharded"`), `SEARCH_BACKEND_PATH` (index location for
+        backends other than `bm25`, which uses `INDEX_PATH`), `DEFAULT_OPERATOR` (`"OR"` or
+        `"AND"`, used between adjacent query terms), `QUERY_LOG_PATH`
+        (empty to disable logging), `WARMUP_PATH` (output of
+        `python -m online_textbook.query_log`, empty to disable warm-up),
+        `WARMUP_QUERIES`, `WARMUP_DOCS`, `DOC_CACHE_SIZE`, `RESULT_CACHE_SIZE`
+        (search results per corpus and whitespace-normalised query), `TITLE_CACHE_SIZE`, `SEMANTIC_INDEX_PATH`, `SEARCH_MODE`
+        (`"bm25"` or `"hybrid"`), and `HYBRID_ALPHA`. The “相关汉字” block
+        uses hybrid ranking whenever the semantic index exists.
+
+        Load shedding: `MAX_QUERY_CHARS` truncates long queries,
+        `MAX_CANDIDATES` caps the documents scored per query and
+        `SEARCH_TIME_BUDGET_MS` stops scoring early with best-so-far results
+        (0 disables either limit). The budget covers the whole request: the
+        suggestion lookup and an automatically rewritten search only get what
+        the first search left over. At most `MAX_CONCURRENT_SEARCHES` searches
+        run at once per process; a request that cannot get a slot within
+        `SEARCH_QUEUE_TIMEOUT_MS` is answered with 503.
+
+        Startup: with `STARTUP_PRELOAD` enabled (the default) the tokenizer
+        (restored from `TOKENIZER_SNAPSHOT_PATH` when present), the index and
+        the page templates are loaded before the first request. Phase timings
+        are logged and kept in `app.extensions["startup"]`.
+
+        Textbooks: `CORPORA_PATH` names a JSON list of corpora (see
+        `online_textbook.corpora`), each served under `/c/<corpus_id>/`, with
+        the first one also answering `/`. Without it the app serves the single
+        corpus described by the settings above, identified by
+        `DEFAULT_CORPUS` and labelled `CORPUS_NAME`. Resident indexes,
+        semantic and suggest indexes and open backends share one budget and
+        are evicted least-recently-used beyond `INDEX_MEMORY_BUDGET_MB`.
+
+        Zero-hit queries: when `SUGGEST_INDEX_PATH` exists (see
+        `query_suggest`), query words missing from the index are matched
+        against the vocabulary by spelling, homophone and pinyin within
+        `SUGGEST_TIME_BUDGET_MS`. A confident correction is searched instead
+        when `AUTO_REWRITE` is enabled; otherwise the page lists suggestions.
     """
 
+    from online_textbook.startup import StartupProfile
+
+    profile = StartupProfile()
+    profile.record("imports", _IMPORTS_MS)
     app = Flask(
         __name__,
         template_folder=str(BASE_DIR / "templates"),
@@ -35,7 +105,34 @@ def create_app(config: dict[str, Any] | None = None) -> Flask:
         "HTMLS_DIR": str(Path(os.getenv("HTMLS_DIR", BASE_DIR / "htmls"))),
         "STOPWORDS_PATH": str(Path(os.getenv("STOPWORDS_PATH", BASE_DIR / "data" / "stopwords.txt"))),
         "INDEX_PATH": str(Path(os.getenv("INDEX_PATH", BASE_DIR / "bm25_index.pkl"))),
+        "SEARCH_BACKEND": os.getenv("SEARCH_BACKEND", "bm25"),
+        "SEARCH_BACKEND_PATH": os.getenv("SEARCH_BACKEND_PATH", ""),
         "TOP_K": int(os.getenv("TOP_K", "10")),
+        "DEFAULT_OPERATOR": os.getenv("DEFAULT_OPERATOR", "OR"),
+        "QUERY_LOG_PATH": os.getenv("QUERY_LOG_PATH", str(BASE_DIR / "logs" / "queries.jsonl")),
+        "WARMUP_PATH": os.getenv("WARMUP_PATH", str(BASE_DIR / "logs" / "popular.json")),
+        "WARMUP_QUERIES": int(os.getenv("WARMUP_QUERIES", "20")),
+        "WARMUP_DOCS": int(os.getenv("WARMUP_DOCS", "50")),
+        "DOC_CACHE_SIZE": int(os.getenv("DOC_CACHE_SIZE", "256")),
+        "RESULT_CACHE_SIZE": int(os.getenv("RESULT_CACHE_SIZE", "512")),
+        "TITLE_CACHE_SIZE": int(os.getenv("TITLE_CACHE_SIZE", "4096")),
+        "SEMANTIC_INDEX_PATH": str(Path(os.getenv("SEMANTIC_INDEX_PATH", BASE_DIR / "semantic_index.npz"))),
+        "SEARCH_MODE": os.getenv("SEARCH_MODE", "bm25"),
+        "HYBRID_ALPHA": float(os.getenv("HYBRID_ALPHA", "0.5")),
+        "MAX_QUERY_CHARS": int(os.getenv("MAX_QUERY_CHARS", "100")),
+        "MAX_CANDIDATES": int(os.getenv("MAX_CANDIDATES", "5000")),
+        "SEARCH_TIME_BUDGET_MS": float(os.getenv("SEARCH_TIME_BUDGET_MS", "300")),
+        "MAX_CONCURRENT_SEARCHES": int(os.getenv("MAX_CONCURRENT_SEARCHES", "4")),
+        "SEARCH_QUEUE_TIMEOUT_MS": float(os.getenv("SEARCH_QUEUE_TIMEOUT_MS", "100")),
+        "STARTUP_PRELOAD": os.getenv("STARTUP_PRELOAD", "1") not in ("0", "false", ""),
+        "TOKENIZER_SNAPSHOT_PATH": os.getenv("TOKENIZER_SNAPSHOT_PATH", DEFAULT_TOKENIZER_SNAPSHOT),
+        "CORPORA_PATH": os.getenv("CORPORA_PATH", ""),
+        "DEFAULT_CORPUS": os.getenv("DEFAULT_CORPUS", "grade2"),
+        "CORPUS_NAME": os.getenv("CORPUS_NAME", "二年级"),
+        "INDEX_MEMORY_BUDGET_MB": float(os.getenv("INDEX_MEMORY_BUDGET_MB", "512")),
+        "SUGGEST_INDEX_PATH": str(Path(os.getenv("SUGGEST_INDEX_PATH", BASE_DIR / "suggest_index.pkl"))),
+        "SUGGEST_TIME_BUDGET_MS": float(os.getenv("SUGGEST_TIME_BUDGET_MS", "30")),
+        "AUTO_REWRITE": os.getenv("AUTO_REWRITE", "1") not in ("0", "false", ""),
     }
 
     app.config.update(default_config)
@@ -43,22 +140,63 @@ def create_app(config: dict[str, Any] | None = None) -> Flask:
     if config:
         app.config.update(config)
 
-    _ensure_runtime_assets(app)
+    app.extensions["corpora"] = _load_corpora(app)
+    set_index_memory_budget(int(app.config["INDEX_MEMORY_BUDGET_MB"] * 1024 * 1024))
+    app.extensions["doc_cache"] = LRUCache(app.config["DOC_CACHE_SIZE"])
+    app.extensions["result_cache"] = LRUCache(app.config["RESULT_CACHE_SIZE"])
+    app.extensions["title_cache"] = LRUCache(app.config["TITLE_CACHE_SIZE"])
+    app.extensions["query_log"] = (
+        QueryLogger(app.config["QUERY_LOG_PATH"]) if app.config["QUERY_LOG_PATH"] else None
+    )
+    app.extensions["search_slots"] = (
+        threading.BoundedSemaphore(app.config["MAX_CONCURRENT_SEARCHES"])
+        if app.config["MAX_CONCURRENT_SEARCHES"] > 0
+        else None
+    )
+
+    with profile.phase("assets"):
+        _ensure_runtime_assets(app)
     _register_routes(app)
     _register_error_handlers(app)
+    if app.config["STARTUP_PRELOAD"]:
+        _preload(app, profile)
+    with profile.phase("warmup"):
+        _warm_up(app)
 
+    app.extensions["startup"] = profile
+    app.logger.info(profile.report())
     return app
 
 
+def _load_corpora(app: Flask) -> dict[str, Corpus]:
+    """Corpora listed in `CORPORA_PATH`, or the single configured corpus."""
+    from online_textbook.corpora import Corpus, load_corpora
+
+    if app.config["CORPORA_PATH"]:
+        return load_corpora(app.config["CORPORA_PATH"])
+    corpus = Corpus(
+        id=app.config["DEFAULT_CORPUS"],
+        name=app.config["CORPUS_NAME"],
+        htmls_dir=app.config["HTMLS_DIR"],
+        index_path=app.config["INDEX_PATH"],
+        backend=app.config["SEARCH_BACKEND"],
+        backend_path=app.config["SEARCH_BACKEND_PATH"],
+        semantic_index_path=app.config["SEMANTIC_INDEX_PATH"],
+        suggest_index_path=app.config["SUGGEST_INDEX_PATH"],
+    )
+    return {corpus.id: corpus}
+
+
 def _ensure_runtime_assets(app: Flask) -> None:
-    htmls_dir = Path(app.config["HTMLS_DIR"])
-    if not htmls_dir.exists():
-        app.logger.warning("HTML目录 %s 不存在，正在创建", htmls_dir)
-        htmls_dir.mkdir(parents=True, exist_ok=True)
+    for corpus in app.extensions["corpora"].values():
+        htmls_dir = Path(corpus.htmls_dir)
+        if not htmls_dir.exists():
+            app.logger.warning("HTML目录 %s 不存在，正在创建", htmls_dir)
+            htmls_dir.mkdir(parents=True, exist_ok=True)
 
-    index_path = Path(app.config["INDEX_PATH"])
-    if not index_path.exists():
-        app.logger.warning("索引文件 %s 不存在，请先构建BM25索引", index_path)
+        index_path = Path(corpus.index_path)
+        if not index_path.exists():
+            app.logger.warning("索引文件 %s 不存在，请先构建BM25索引", index_path)
 
     stopwords_path = Path(app.config["STOPWORDS_PATH"])
     if stopwords_path.exists():
@@ -70,18 +208,304 @@ def _ensure_runtime_assets(app: Flask) -> None:
         app.logger.warning("停用词文件 %s 不存在", stopwords_path)
 
 
-def _get_html_title(doc_id: int) -> str:
-    htmls_dir = Path(current_app.config["HTMLS_DIR"])
-    html_file = htmls_dir / f"{doc_id}.html"
+def _preload(app: Flask, profile: StartupProfile) -> None:
+    """Load what the first search needs so no visitor pays for it."""
+    with profile.phase("tokenizer"):
+        get_tokenizer(app.config["TOKENIZER_SNAPSHOT_PATH"])
+
+    with profile.phase("index"), app.app_context():
+        try:
+            _backend(_default_corpus())  # 其余教材的索引在首次访问时加载
+        except ValueError as exc:
+            app.logger.warning("检索后端预加载失败：%s", exc)
+
+    with profile.phase("suggest"), app.app_context():
+        corpus = _default_corpus()
+        if _suggest_available(corpus):
+            from query_suggest import load_suggest_index
+
+            try:
+                load_suggest_index(corpus.suggest_index_path)
+            except ValueError as exc:
+                app.logger.warning("纠错索引预加载失败：%s", exc)
+
+    with profile.phase("templates"):
+        for name in ("search.html", "results.html", "error.html"):
+            app.jinja_env.get_template(name)
+
+
+def _warm_up(app: Flask) -> None:
+    """Pre-execute popular queries and pre-render popular documents.
+
+    Reads the aggregate written by ``python -m online_textbook.query_log`` and
+    fills the result, title and document caches, so the most frequent
+    searches and pages are answered from memory from the first request on.
+    Each query is run against the textbook it was searched in (``"*"`` for
+    a search across all textbooks).
+    """
+    if not app.config["WARMUP_PATH"]:
+        return  # 与 QUERY_LOG_PATH 相同，空字符串表示关闭；Path("") 会指向当前目录
+    warmup_path = Path(app.config["WARMUP_PATH"])
+    if not warmup_path.exists():
+        return
+
+    try:
+        popular = json.loads(warmup_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        app.logger.warning("无法读取预热文件：%s", warmup_path)
+        return
+
+    started = time.perf_counter()
+    queries = popular.get("queries", [])[: app.config["WARMUP_QUERIES"]]
+    documents = popular.get("documents", [])[: app.config["WARMUP_DOCS"]]
+    corpora = app.extensions["corpora"]
+
+    with app.app_context():
+        for item in queries:
+            query = item["query"]
+            try:
+                if item.get("corpus") == "*":
+                    for corpus, doc_id, _ in _search_all(query, {}):
+                        _get_html_title(doc_id, corpus)
+                    continue
+                # 旧日志没有 corpus 字段，归入默认教材
+                corpus = corpora.get(item.get("corpus")) if item.get("corpus") else _default_corpus()
+                if corpus is not None:
+                    for doc_id, _ in _search(query, corpus=corpus):
+                        _get_html_title(doc_id, corpus)
+            except Exception:  # noqa: BLE001
+                app.logger.warning("预热查询失败：%s", query)
+        for item in documents:
+            corpus = corpora.get(item.get("corpus")) if item.get("corpus") else _default_corpus()
+            if corpus is not None:
+                _cached_document(corpus, int(item["doc_id"]))
+
+    app.logger.info(
+        "预热完成：%d 条查询，%d 个文档，耗时 %.0f ms",
+        len(queries),
+        len(documents),
+        (time.perf_counter() - started) * 1000,
+    )
+
+
+def _log_query(record_type: str, **fields: Any) -> None:
+    query_log = current_app.extensions.get("query_log")
+    if query_log is not None:
+        query_log.log(record_type, **fields)
+
+
+def _default_corpus() -> Corpus:
+    return next(iter(current_app.extensions["corpora"].values()))
+
+
+def _corpus(corpus_id: str | None) -> Corpus:
+    """Resolve the corpus of the current request (404 if unknown)."""
+    if corpus_id is None:
+        corpus = _default_corpus()
+    else:
+        corpus = current_app.extensions["corpora"].get(corpus_id)
+        if corpus is None:
+            abort(404, description=f"教材 {corpus_id} 不存在")
+    g.corpus = corpus
+    return corpus
+
+
+def _url_prefix(corpus: Corpus) -> str:
+    """The default corpus keeps the original unprefixed URLs."""
+    return "" if corpus.id == _default_corpus().id else f"/c/{corpus.id}"
+
+
+def _semantic_available(corpus: Corpus) -> bool:
+    return bool(corpus.semantic_index_path) and Path(corpus.semantic_index_path).exists()
+
+
+def _suggest_available(corpus: Corpus) -> bool:
+    return bool(corpus.suggest_index_path) and Path(corpus.suggest_index_path).exists()
+
+
+def _backend(corpus: Corpus) -> SearchBackend:
+    # 停用词与分词器由所有教材共享
+    location = corpus.index_path if corpus.backend == "bm25" else corpus.backend_path or None
+    return open_backend(corpus.backend, location, current_app.config["STOPWORDS_PATH"])
+
+
+@contextmanager
+def _search_slot() -> Iterator[None]:
+    """Hold one of the per-process search slots, or fail fast with 503."""
+    slots = current_app.extensions.get("search_slots")
+    if slots is None:
+        yield
+        return
+    if not slots.acquire(timeout=current_app.config["SEARCH_QUEUE_TIMEOUT_MS"] / 1000):
+        abort(503, description="当前检索人数较多，请稍后再试")
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+def _search(
+    query: str,
+    stats: dict | None = None,
+    top_n: int | None = None,
+    hybrid: bool | None = None,
+    default_operator: str | None = None,
+    corpus: Corpus | None = None,
+    time_budget: float | None = None,
+) -> list[tuple[int, float]]:
+    if hybrid is None:
+        hybrid = current_app.config.get("SEARCH_MODE") == "hybrid"
+    corpus = corpus or _default_corpus()
+    backend = _backend(corpus)
+    top_n = top_n or current_app.config.get("TOP_K", 10)
+    default_operator = default_operator or current_app.config.get("DEFAULT_OPERATOR", "OR")
+
+    stats = {} if stats is None else stats
+    max_chars = current_app.config.get("MAX_QUERY_CHARS", 0)
+    stats["truncated"] = bool(max_chars) and len(query) > max_chars
+    if stats["truncated"]:
+        query = query[:max_chars]  # 粘贴整段课文时只检索开头部分，避免分词与打分耗时失控
+    if time_budget is None:
+        budget_ms = current_app.config.get("SEARCH_TIME_BUDGET_MS", 0)
+        time_budget = budget_ms / 1000 if budget_ms > 0 else None
+    max_candidates = current_app.config.get("MAX_CANDIDATES", 0) or None
+    # 语义索引由 pickle 倒排索引训练，混合排序仅用于 bm25 后端
+    hybrid = hybrid and backend.name == "bm25" and _semantic_available(corpus)
+
+    # 以规整空白后的查询串为键：命中缓存时不必分词，未命中时只由后端分词一次
+    started = time.perf_counter()
+    normalized = " ".join(query.split())
+    cache_key = (corpus.id, _index_version(backend), normalized, default_operator.upper(), hybrid, top_n)
+    result_cache: LRUCache = current_app.extensions["result_cache"]
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        hits, tokens, candidates = cached
+        stats.update(tokens=list(tokens), candidates=candidates, partial=False,
+                     timings={"cache": (time.perf_counter() - started) * 1000})
+        return list(hits)
+
+    if hybrid:
+        from semantic_index import hybrid_retrieve  # 延迟导入 NumPy
+
+        hits = hybrid_retrieve(
+            query,
+            index_path=backend.location,
+            semantic_path=corpus.semantic_index_path,
+            stopwords_path=current_app.config["STOPWORDS_PATH"],
+            top_n=top_n,
+            alpha=current_app.config.get("HYBRID_ALPHA", 0.5),
+            default_operator=default_operator,
+            stats=stats,
+            time_budget=time_budget,
+            max_candidates=max_candidates,
+        )
+    else:
+        hits = backend.search(
+            query,
+            top_n=top_n,
+            default_operator=default_operator,
+            stats=stats,
+            time_budget=time_budget,
+            max_candidates=max_candidates,
+        )
+    if not stats.get("partial"):  # 不完整的结果不缓存
+        result_cache.put(cache_key, (tuple(hits), tuple(stats.get("tokens", [])), stats.get("candidates", 0)))
+    return hits
+
+
+def _index_version(backend: SearchBackend) -> int:
+    """Modification time of the index, so a rebuilt index never serves cached results."""
+    try:
+        return Path(backend.location).stat().st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _request_deadline() -> float | None:
+    """`perf_counter` value by which a search request should be answered."""
+    budget_ms = current_app.config.get("SEARCH_TIME_BUDGET_MS", 0)
+    return time.perf_counter() + budget_ms / 1000 if budget_ms > 0 else None
+
+
+def _time_left(deadline: float | None) -> float | None:
+    return None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+
+
+def _search_all(query: str, stats: dict, time_budget: float | None = None) -> list[tuple[Corpus, int, float]]:
+    """Search every corpus and merge the hits by BM25 score.
+
+    Each corpus is scored with its own statistics; the time budget is shared,
+    so later corpora get whatever the earlier ones left over.
+    """
+    if time_budget is None:
+        deadline = _request_deadline()
+    else:
+        deadline = time.perf_counter() + time_budget
+    stats.update(tokens=[], candidates=0, partial=False, truncated=False)
 
+    merged = []
+    for corpus in current_app.extensions["corpora"].values():
+        corpus_stats: dict[str, Any] = {}
+        try:
+            hits = _search(query, stats=corpus_stats, corpus=corpus, time_budget=_time_left(deadline))
+        except ValueError as exc:
+            current_app.logger.warning("教材 %s 检索失败：%s", corpus.id, exc)
+            stats["partial"] = True
+            continue
+        stats["tokens"] = stats["tokens"] or corpus_stats.get("tokens", [])
+        stats["candidates"] += corpus_stats.get("candidates", 0)
+        stats["partial"] = stats["partial"] or corpus_stats.get("partial", False)
+        stats["truncated"] = corpus_stats.get("truncated", False)
+        merged.extend((corpus, doc_id, score) for doc_id, score in hits)
+    return heapq.nlargest(current_app.config.get("TOP_K", 10), merged, key=lambda hit: hit[2])
+
+
+def _suggest(
+    query: str, query_words: list[str], corpus: Corpus, time_budget: float | None = None
+) -> list[Suggestion]:
+    """Corrections for a query without hits, from the corpus' suggest index.
+
+    `time_budget` is what is left of the request's deadline; the suggest
+    budget never extends past it.
+    """
+    if not query_words or not _suggest_available(corpus):
+        return []
+    from query_suggest import load_suggest_index
+
+    budget_ms = current_app.config.get("SUGGEST_TIME_BUDGET_MS", 0)
+    budget = budget_ms / 1000 if budget_ms > 0 else None
+    if time_budget is not None:
+        budget = time_budget if budget is None else min(budget, time_budget)
+    try:
+        suggest_index = load_suggest_index(corpus.suggest_index_path)
+    except ValueError as exc:
+        current_app.logger.warning("教材 %s 的纠错索引不可用：%s", corpus.id, exc)
+        return []
+    return suggest_index.suggest(query, query_words, time_budget=budget)
+
+
+def _get_html_title(doc_id: int, corpus: Corpus | None = None) -> str:
+    from html_extract import extract_document
+
+    corpus = corpus or _default_corpus()
+    title_cache: LRUCache = current_app.extensions["title_cache"]
+    title = title_cache.get((corpus.id, doc_id))
+    if title is not None:
+        return title
+
+    html_file = Path(corpus.htmls_dir) / f"{doc_id}.html"
     if not html_file.exists():
         return f"文档{doc_id}"
 
-    soup = _load_html_soup(html_file)
-    return soup.title.get_text(strip=True) if soup.title else f"文档{doc_id}"
+    title = extract_document(html_file).title
+    title = title if title is not None else f"文档{doc_id}"
+    title_cache.put((corpus.id, doc_id), title)
+    return title
 
 
 def _load_html_soup(html_file: Path) -> BeautifulSoup:
+    from bs4 import BeautifulSoup
+
     try:
         with html_file.open("r", encoding="utf-8") as f:
             return BeautifulSoup(f.read(), "lxml")
@@ -91,104 +515,205 @@ def _load_html_soup(html_file: Path) -> BeautifulSoup:
 
 
 def _register_routes(app: Flask) -> None:
-    @app.get("/")
-    def search_page():
+    @app.context_processor
+    def inject_corpus() -> dict[str, Any]:
+        corpus = g.get("corpus") or _default_corpus()
+        return {
+            "corpus": corpus,
+            "corpora": current_app.extensions["corpora"],
+            "url_prefix": _url_prefix(corpus),
+        }
+
+    @app.get("/", defaults={"corpus_id": None})
+    @app.get("/c/<corpus_id>/")
+    def search_page(corpus_id: str | None):
+        _corpus(corpus_id)
         return render_template("search.html")
 
-    @app.post("/search")
-    def handle_search():
+    @app.post("/search", defaults={"corpus_id": None})
+    @app.post("/c/<corpus_id>/search")
+    def handle_search(corpus_id: str | None):
+        corpus = _corpus(corpus_id)
         query = request.form.get("query", "").strip()
         if not query:
             return render_template("search.html", error="请输入检索词")
 
-        try:
-            raw_results = retrieve(
-                query=query,
-                index_path=current_app.config["INDEX_PATH"],
-                stopwords_path=current_app.config["STOPWORDS_PATH"],
-                top_n=current_app.config.get("TOP_K", 10),
-            )
-        except ValueError as exc:
-            current_app.logger.exception("检索失败：%s", exc)
-            return render_template("search.html", error=str(exc))
-        except Exception as exc:  # noqa: BLE001
-            current_app.logger.exception("检索发生异常")
-            return render_template("search.html", error=f"检索出错：{exc}")
+        search_all = request.form.get("scope") == "all"
+        exact = request.form.get("exact") == "1"  # “仍然检索”原词时不再自动改写
 
+        # 首次检索、纠错建议与自动改写后的检索共用同一个请求级时限
+        deadline = _request_deadline()
+
+        def run(text: str, run_stats: dict[str, Any]) -> list[tuple[Corpus, int, float]]:
+            time_budget = _time_left(deadline)
+            if search_all:
+                return _search_all(text, run_stats, time_budget=time_budget)
+            hits = _search(text, stats=run_stats, corpus=corpus, time_budget=time_budget)
+            return [(corpus, doc_id, score) for doc_id, score in hits]
+
+        started = time.perf_counter()
+        stats: dict[str, Any] = {}
+        suggestions: list[Suggestion] = []
+        original_query = query
+        with _search_slot():
+            try:
+                hits = run(query, stats)
+                if not hits and not stats.get("partial"):
+                    suggest_started = time.perf_counter()
+                    suggestions = _suggest(query, stats.get("tokens", []), corpus, time_budget=_time_left(deadline))
+                    stats.setdefault("timings", {})["suggest"] = (time.perf_counter() - suggest_started) * 1000
+                if suggestions and suggestions[0].confident and not exact and current_app.config["AUTO_REWRITE"]:
+                    rewrite_stats: dict[str, Any] = {}
+                    rewrite_hits = run(suggestions[0].query, rewrite_stats)
+                    if rewrite_hits:
+                        query, hits, suggestions = suggestions[0].query, rewrite_hits, []
+                        stats["partial"] = rewrite_stats.get("partial", False)
+            except ValueError as exc:
+                current_app.logger.exception("检索失败：%s", exc)
+                return render_template("search.html", error=str(exc))
+            except Exception as exc:  # noqa: BLE001
+                current_app.logger.exception("检索发生异常")
+                return render_template("search.html", error=f"检索出错：{exc}")
+
+        titles_started = time.perf_counter()
         results_with_title = [
-            (doc_id, score, _get_html_title(doc_id))
-            for doc_id, score in raw_results
+            (
+                doc_id,
+                score,
+                _get_html_title(doc_id, hit_corpus),
+                f"{_url_prefix(hit_corpus)}/doc/{doc_id}",
+                hit_corpus.name if search_all else None,
+            )
+            for hit_corpus, doc_id, score in hits
         ]
 
-        return render_template(
+        render_started = time.perf_counter()
+        page = render_template(
             "results.html",
             query=query,
             results=results_with_title,
             total=len(results_with_title),
+            partial=stats.get("partial", False),
+            truncated_to=current_app.config["MAX_QUERY_CHARS"] if stats.get("truncated") else None,
+            search_all=search_all,
+            rewritten_from=original_query if query != original_query else None,
+            suggestions=[suggestion.query for suggestion in suggestions],
         )
 
-    @app.get("/doc/<int:doc_id>")
-    def show_document(doc_id: int):
-        htmls_dir = Path(current_app.config["HTMLS_DIR"])
-        html_file = htmls_dir / f"{doc_id}.html"
-
-        if not html_file.exists():
+        finished = time.perf_counter()
+        latency_ms = {stage: round(ms, 3) for stage, ms in stats.get("timings", {}).items()}
+        latency_ms.update(
+            titles=round((render_started - titles_started) * 1000, 3),
+            render=round((finished - render_started) * 1000, 3),
+            total=round((finished - started) * 1000, 3),
+        )
+        fields: dict[str, Any] = {}
+        if search_all:
+            fields["corpora"] = [hit_corpus.id for hit_corpus, _, _ in hits]
+        if query != original_query:
+            fields["rewritten"] = query
+        if suggestions:
+            fields["suggestions"] = [suggestion.query for suggestion in suggestions]
+        _log_query(
+            "search",
+            query=original_query,
+            corpus="*" if search_all else corpus.id,
+            tokens=stats.get("tokens", []),
+            results=len(hits),
+            candidates=stats.get("candidates", 0),
+            partial=stats.get("partial", False),
+            doc_ids=[doc_id for _, doc_id, _ in hits],
+            latency_ms=latency_ms,
+            **fields,
+        )
+        return page
+
+    @app.get("/doc/<int:doc_id>", defaults={"corpus_id": None})
+    @app.get("/c/<corpus_id>/doc/<int:doc_id>")
+    def show_document(corpus_id: str | None, doc_id: int):
+        corpus = _corpus(corpus_id)
+        page = _cached_document(corpus, doc_id)
+        if page is None:
             abort(404, description=f"文档 {doc_id} 不存在")
+        _log_query("doc", corpus=corpus.id, doc_id=doc_id)
+        return page
 
-        soup = _load_html_soup(html_file)
-        current_title = soup.title.get_text(strip=True) if soup.title else f"文档{doc_id}"
 
-        related_items = []
-        if current_title:
-            try:
-                related_docs = retrieve(
-                    query=current_title,
-                    index_path=current_app.config["INDEX_PATH"],
-                    stopwords_path=current_app.config["STOPWORDS_PATH"],
-                    top_n=5,
-                )
-            except Exception:  # noqa: BLE001
-                related_docs = []
+def _cached_document(corpus: Corpus, doc_id: int) -> str | None:
+    doc_cache: LRUCache = current_app.extensions["doc_cache"]
+    page = doc_cache.get((corpus.id, doc_id))
+    if page is None:
+        page = _render_document(corpus, doc_id)
+        if page is not None:
+            doc_cache.put((corpus.id, doc_id), page)
+    return page
 
-            for rel_doc_id, _ in related_docs:
-                if rel_doc_id == doc_id:
-                    continue
 
-                rel_html_path = htmls_dir / f"{rel_doc_id}.html"
-                if not rel_html_path.exists():
-                    continue
+def _render_document(corpus: Corpus, doc_id: int) -> str | None:
+    """Render a document page with its “相关汉字” block filled in."""
+    from html_extract import extract_document
 
-                rel_soup = _load_html_soup(rel_html_path)
-                rel_title = rel_soup.title.get_text(strip=True) if rel_soup.title else f"文档{rel_doc_id}"
-                rel_p_tags = rel_soup.find_all("p")
-                rel_desc = (
-                    rel_p_tags[0].get_text(strip=True)[:20] + "..."
-                    if rel_p_tags
-                    else ""
-                )
-
-                related_items.append(
-                    {
-                        "url": f"/doc/{rel_doc_id}",
-                        "text": rel_title,
-                        "desc": rel_desc,
-                    }
-                )
-
-        related_container = soup.find("div", class_="related-container")
-        if related_container is not None:
-            related_container.clear()
-            for item in related_items:
-                item_div = soup.new_tag("div", attrs={"class": "related-item"})
-                a_tag = soup.new_tag("a", attrs={"href": item["url"]})
-                a_tag.string = item["text"]
-                p_tag = soup.new_tag("p")
-                p_tag.string = item["desc"]
-                item_div.append(a_tag)
-                item_div.append(p_tag)
-                related_container.append(item_div)
-
-        return str(soup)
+    htmls_dir = Path(corpus.htmls_dir)
+    html_file = htmls_dir / f"{doc_id}.html"
+
+    if not html_file.exists():
+        return None
+
+    soup = _load_html_soup(html_file)
+    current_title = soup.title.get_text(strip=True) if soup.title else f"文档{doc_id}"
+
+    related_items = []
+    if current_title:
+        try:
+            # 语义索引可用时混合排序，召回没有字面重合的相关汉字
+            related_docs = _search(current_title, top_n=5, hybrid=True, default_operator="OR", corpus=corpus)
+        except Exception:  # noqa: BLE001
+            related_docs = []
+
+        for rel_doc_id, _ in related_docs:
+            if rel_doc_id == doc_id:
+                continue
+
+            rel_html_path = htmls_dir / f"{rel_doc_id}.html"
+            if not rel_html_path.exists():
+                continue
+
+            rel_doc = extract_document(rel_html_path)
+            rel_title = rel_doc.title if rel_doc.title is not None else f"文档{rel_doc_id}"
+            rel_desc = (
+                rel_doc.paragraphs[0][:20] + "..."
+                if rel_doc.paragraphs
+                else ""
+            )
+
+            related_items.append(
+                {
+                    "url": f"{_url_prefix(corpus)}/doc/{rel_doc_id}",
+                    "text": rel_title,
+                    "desc": rel_desc,
+                }
+            )
+
+    # 生成的HTML顶部栏写死了年级，替换为所属教材的名称
+    top_bar = soup.find("div", class_="top-bar")
+    labels = top_bar.find_all("span") if top_bar is not None else []
+    if len(labels) > 1 and labels[1].get_text(strip=True) != corpus.name:
+        labels[1].string = corpus.name
+
+    related_container = soup.find("div", class_="related-container")
+    if related_container is not None:
+        related_container.clear()
+        for item in related_items:
+            item_div = soup.new_tag("div", attrs={"class": "related-item"})
+            a_tag = soup.new_tag("a", attrs={"href": item["url"]})
+            a_tag.string = item["text"]
+            p_tag = soup.new_tag("p")
+            p_tag.string = item["desc"]
+            item_div.append(a_tag)
+            item_div.append(p_tag)
+            related_container.append(item_div)
+
+    return str(soup)
 
 
 def _register_error_handlers(app: Flask) -> None:
@@ -196,6 +721,11 @@ def _register_error_handlers(app: Flask) -> None:
     def page_not_found(error):  # type: ignore[override]
         return render_template("error.html", code=404, message=error.description), 404
 
+    @app.errorhandler(503)
+    def service_unavailable(error):  # type: ignore[override]
+        page = render_template("error.html", code=503, message=error.description)
+        return page, 503, {"Retry-After": "1"}
+
     @app.errorhandler(500)
     def internal_error(error):  # type: ignore[override]
         message = getattr(error, "description", "服务器发生错误")
@@ -0,0 +1,143 @@
+"""Textbook corpora served by one deployment.
+
+Each corpus is one textbook (for example one grade) with its own HTML
+documents and index, served under ``/c/<corpus_id>/``. The corpora are listed
+in a JSON file named by ``CORPORA_PATH``::
+
+    {
+      "grade2": {"name": "二年级", "htmls_dir": "htmls", "index_path": "bm25_index.pkl"},
+      "grade3": {"name": "三年级", "htmls_dir": "corpora/grade3/htmls",
+                 "index_path": "corpora/grade3/bm25_index.pkl"}
+    }
+
+Optional keys are ``backend``/``backend_path`` (see ``search_backends``),
+``semantic_index_path`` and ``suggest_index_path`` (see ``query_suggest``). Relative paths are resolved against the directory
+of the JSON file. The first entry is the default corpus, which also answers
+the original ``/``, ``/search`` and ``/doc/<id>`` URLs. The tokenizer and
+stopwords are shared by all corpora; indexes, open backends and semantic and
+suggest indexes are loaded on first use and evicted least-recently-used once
+their combined estimate exceeds ``INDEX_MEMORY_BUDGET_MB``.
+
+Build the index of every corpus (or of the given ids)::
+
+    python -m online_textbook.corpora corpora.json build grade3
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+from pathlib import Path
+from typing import NamedTuple
+
+from search_backends import BACKENDS
+
+
+_CORPUS_ID_RE = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class Corpus(NamedTuple):
+    id: str
+    name: str  # 显示在顶部栏，如“二年级”
+    htmls_dir: str
+    index_path: str
+    backend: str = "bm25"
+    backend_path: str = ""  # 非 bm25 后端的索引位置，缺省为该后端的默认路径
+    semantic_index_path: str = ""  # 为空时不使用混合排序
+    suggest_index_path: str = ""  # 为空时零结果查询不给出纠错建议
+
+
+def load_corpora(path: str | os.PathLike[str]) -> dict[str, Corpus]:
+    """读取教材列表，返回按文件顺序排列的 {corpus_id: Corpus}"""
+    path = Path(path)
+    try:
+        entries = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError as exc:
+        raise ValueError(f"教材列表不存在：{path}") from exc
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"教材列表格式错误：{path}：{exc}") from exc
+
+    base_dir = path.parent
+    corpora: dict[str, Corpus] = {}
+    for corpus_id, entry in entries.items():
+        if not _CORPUS_ID_RE.fullmatch(corpus_id):
+            raise ValueError(f"教材ID只能包含字母、数字、- 与 _：{corpus_id}")
+        backend = entry.get("backend", "bm25")
+        if backend not in BACKENDS:
+            raise ValueError(f"教材 {corpus_id} 的检索后端未知：{backend}")
+        if "htmls_dir" not in entry or "index_path" not in entry:
+            raise ValueError(f"教材 {corpus_id} 缺少 htmls_dir 或 index_path")
+
+        def resolve(key: str) -> str:
+            value = entry.get(key)
+            return str(base_dir / value) if value else ""
+
+        corpora[corpus_id] = Corpus(
+            id=corpus_id,
+            name=entry.get("name", corpus_id),
+            htmls_dir=resolve("htmls_dir"),
+            index_path=resolve("index_path"),
+            backend=backend,
+            backend_path=resolve("backend_path"),
+            semantic_index_path=resolve("semantic_index_path"),
+            suggest_index_path=resolve("suggest_index_path"),
+        )
+    if not corpora:
+        raise ValueError(f"教材列表为空：{path}")
+    return corpora
+
+
+def document_range(htmls_dir: str | os.PathLike[str]) -> tuple[int, int]:
+    """目录中 ``<数字>.html`` 文件的最小与最大编号"""
+    doc_ids = [int(p.stem) for p in Path(htmls_dir).glob("*.html") if p.stem.isdigit()]
+    if not doc_ids:
+        raise ValueError(f"目录中没有可索引的HTML文件：{htmls_dir}")
+    return min(doc_ids), max(doc_ids)
+
+
+def build_corpus(corpus: Corpus, stopwords_path: str | None = None) -> None:
+    """按教材配置的后端构建其索引，并由BM25索引的词表构建纠错索引"""
+    start, end = document_range(corpus.htmls_dir)
+    location = corpus.index_path if corpus.backend == "bm25" else corpus.backend_path or None
+    BACKENDS[corpus.backend].build(
+        location, htmls_dir=corpus.htmls_dir, stopwords_path=stopwords_path, start=start, end=end
+    )
+    if corpus.suggest_index_path:
+        if not Path(corpus.index_path).exists():
+            print(f"[WARN] 缺少BM25索引 {corpus.index_path}，跳过纠错索引")
+            return
+        from query_suggest import build_suggest_index
+
+        build_suggest_index(corpus.index_path, corpus.htmls_dir, corpus.suggest_index_path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="多教材列表的查看与索引构建")
+    parser.add_argument("corpora", help="教材列表 JSON 文件")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出教材及其索引状态")
+    build = sub.add_parser("build", help="构建教材索引")
+    build.add_argument("ids", nargs="*", help="只构建指定的教材，缺省为全部")
+    build.add_argument("--stopwords", default=None)
+
+    args = parser.parse_args(argv)
+    corpora = load_corpora(args.corpora)
+    if args.command == "list":
+        for corpus in corpora.values():
+            index_path = Path(corpus.index_path)
+            status = f"{index_path.stat().st_size // 1024} KB" if index_path.exists() else "未构建"
+            print(f"{corpus.id:<12} {corpus.name:<8} {corpus.htmls_dir}  索引：{status}")
+        return
+
+    unknown = [corpus_id for corpus_id in args.ids if corpus_id not in corpora]
+    if unknown:
+        parser.error(f"未知的教材：{', '.join(unknown)}")
+    for corpus_id in args.ids or list(corpora):
+        print(f"正在构建 {corpus_id}（{corpora[corpus_id].name}）……")
+        build_corpus(corpora[corpus_id], stopwords_path=args.stopwords)
+
+
+if __name__ == "__main__":
+    main()
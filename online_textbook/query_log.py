@@ -0,0 +1,166 @@
+"""Append-only structured query log and offline popularity aggregation.
+
+Records are JSON lines written by a background thread, so logging never
+blocks a request. Two record types are written:
+
+* ``{"type": "search", "query", "corpus", "tokens", "results", "doc_ids", "latency_ms", ...}``
+  (``corpus`` is ``"*"`` for a search across all textbooks, with the corpus
+  of each hit in ``corpora``)
+* ``{"type": "doc", "corpus", "doc_id"}`` for every document page view
+
+Aggregate one or more logs into the warm-up file read by ``create_app``::
+
+    python -m online_textbook.query_log logs/queries.jsonl -o logs/popular.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterable
+
+
+_STOP = object()
+
+
+class QueryLogger:
+    """Buffered JSON-lines writer running on a daemon thread.
+
+    ``log`` only enqueues; when the buffer is full the record is dropped and
+    counted in ``dropped`` rather than slowing the request down.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        max_buffer: int = 10000,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_buffer)
+        self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, record_type: str, **fields: Any) -> None:
+        record = {"ts": round(time.time(), 3), "type": record_type, **fields}
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        with self.path.open("a", encoding="utf-8") as f:
+            while True:
+                try:
+                    record = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                batch = [record]
+                while len(batch) < 512:  # drain whatever is already buffered
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = any(item is _STOP for item in batch)
+                lines = [json.dumps(item, ensure_ascii=False) + "\n" for item in batch if item is not _STOP]
+                if lines:
+                    f.write("".join(lines))
+                    f.flush()
+                if stop:
+                    return
+
+
+def read_log(paths: Iterable[str | os.PathLike[str]]):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a torn last line from a killed worker
+
+
+def aggregate(paths: Iterable[str | os.PathLike[str]], top: int = 50) -> dict[str, Any]:
+    """Count popular queries and documents across query logs.
+
+    Queries are grouped by textbook and normalised tokens so that spacing
+    and stopword variants collapse together; the most frequent spelling is
+    kept. Documents are ranked by page views plus one vote per search in which
+    they were the top result, separately per textbook (records written
+    before multi-textbook hosting have no corpus).
+    """
+    query_counts: Counter = Counter()
+    spellings: dict[tuple, Counter] = {}
+    doc_counts: Counter = Counter()
+    latencies: list[float] = []
+
+    for record in read_log(paths):
+        if record.get("type") == "doc":
+            doc_counts[(record.get("corpus"), record["doc_id"])] += 1
+            continue
+        if record.get("type") != "search":
+            continue
+        key = (record.get("corpus"), tuple(record.get("tokens") or [record.get("query", "")]))
+        query_counts[key] += 1
+        spellings.setdefault(key, Counter())[record.get("query", "")] += 1
+        if record.get("doc_ids"):
+            corpus = record["corpora"][0] if record.get("corpus") == "*" else record.get("corpus")
+            doc_counts[(corpus, record["doc_ids"][0])] += 1
+        total = record.get("latency_ms", {}).get("total")
+        if total is not None:
+            latencies.append(total)
+
+    latencies.sort()
+    return {
+        "queries": [
+            {"corpus": key[0], "query": spellings[key].most_common(1)[0][0], "count": count}
+            for key, count in query_counts.most_common(top)
+        ],
+        "documents": [
+            {"corpus": corpus, "doc_id": doc_id, "count": count}
+            for (corpus, doc_id), count in doc_counts.most_common(top)
+        ],
+        "searches": sum(query_counts.values()),
+        "p50_ms": latencies[len(latencies) // 2] if latencies else None,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] if latencies else None,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="汇总检索日志，生成热门查询与热门文档列表")
+    parser.add_argument("logs", nargs="+", help="查询日志（JSON lines）")
+    parser.add_argument("-o", "--output", help="输出的预热文件；缺省打印到标准输出")
+    parser.add_argument("--top", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    summary = aggregate(args.logs, top=args.top)
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(text, encoding="utf-8")
+        print(f"已写入 {args.output}：{len(summary['queries'])} 条热门查询，{len(summary['documents'])} 个热门文档")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
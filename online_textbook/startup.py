@@ -0,0 +1,78 @@
+"""Startup timing report and the snapshot step run at build time.
+
+``create_app`` records how long each startup phase takes (imports, runtime
+assets, tokenizer, index, suggest, templates, warm-up) and logs one summary line.
+Run the same path locally, including the first search request::
+
+    python -m online_textbook.startup profile
+    python -m online_textbook.startup snapshot   # tokenizer_snapshot.pkl
+
+The tokenizer snapshot restores jieba's prefix dictionary several times
+faster than jieba's own cache and is picked up automatically when present.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from search_engine import DEFAULT_TOKENIZER_SNAPSHOT, save_tokenizer_snapshot
+
+
+class StartupProfile:
+    """Wall-clock milliseconds spent in each named startup phase."""
+
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+
+    def record(self, name: str, ms: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + ms
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(self.phases.values())
+
+    def report(self) -> str:
+        parts = "，".join(f"{name} {ms:.0f} ms" for name, ms in self.phases.items())
+        return f"启动耗时 {self.total_ms:.0f} ms（{parts}）"
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="启动耗时分析与启动快照生成")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    profile = sub.add_parser("profile", help="创建应用并执行一次检索，打印各阶段耗时")
+    profile.add_argument("--query", default="春天")
+
+    snapshot = sub.add_parser("snapshot", help="生成分词词典快照")
+    snapshot.add_argument("--out", default=DEFAULT_TOKENIZER_SNAPSHOT)
+
+    args = parser.parse_args(argv)
+    if args.command == "snapshot":
+        started = time.perf_counter()
+        path = save_tokenizer_snapshot(args.out)
+        print(f"分词词典快照已保存至 {path}，耗时 {time.perf_counter() - started:.2f}s")
+        return
+
+    from online_textbook import create_app
+
+    app = create_app({"QUERY_LOG_PATH": ""})
+    startup: StartupProfile = app.extensions["startup"]
+    with startup.phase("first_search"):
+        response = app.test_client().post("/search", data={"query": args.query})
+    print(startup.report())
+    print(f"首个检索请求返回 {response.status_code}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""零结果查询的纠错建议（“您是不是要找”）与自动改写。
+
+查询词不在倒排索引中时，BM25 检索只能返回空结果。离线阶段由 ``bm25_index.pkl``
+的词表与教材页面构造一份纠错索引，保存为 pickle：
+
+* 字符 n-gram 倒排：含汉字的词按单字与相邻双字登记，召回字面相近的词，再按
+  有上限的编辑距离排序（如“凶狠”→“凶”“凶恶”）
+* 拼音表：汉字 → 无声调拼音。纠错索引只保存教材收录的字（取自各页“音”一节）；
+  CJK 基本区其余汉字的读音由 ``pypinyin`` 在构建时生成一次，另存为所有教材
+  共享的 ``pinyin_readings.pkl``，每个进程只加载一次。未安装 ``pypinyin`` 或
+  共享表缺失时只覆盖教材收录的字
+* 拼音串 → 词：用于同音字（“春田”→“春天”）与直接输入的拼音（“xiong”→“凶”）
+
+检索时只为词表中不存在的查询词找候选，整个过程受 ``time_budget`` 限制，
+用尽时返回已经排好的候选。
+
+用法::
+
+    python -m query_suggest build
+    python -m query_suggest query 凶狠
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import itertools
+import math
+import os
+import pickle
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import ChainMap, Counter, defaultdict
+from pathlib import Path
+from typing import NamedTuple
+
+from search_engine import (
+    BASE_DIR,
+    DEFAULT_HTMLS_DIR,
+    DEFAULT_INDEX_PATH,
+    load_cached_resource,
+    load_index,
+    load_stopwords,
+    tokenize,
+)
+
+
+DEFAULT_SUGGEST_PATH = os.getenv("SUGGEST_INDEX_PATH", str(BASE_DIR / "suggest_index.pkl"))
+DEFAULT_PINYIN_PATH = os.getenv("PINYIN_TABLE_PATH", str(BASE_DIR / "pinyin_readings.pkl"))
+SUGGEST_INDEX_VERSION = 2
+MAX_EDIT_DISTANCE = 2
+MAX_PINYIN_KEYS = 8  # 多音字组合出的拼音串上限
+GRAM_CANDIDATES = 200  # 按 n-gram 重合数保留、再计算编辑距离的词数
+DEADLINE_CHECK_INTERVAL = 32
+
+# 候选分数 = 相似度 + 词频加分 + 教材收录字加分
+PINYIN_SIMILARITY = 0.9  # 输入的拼音与词的读音完全一致
+HOMOPHONE_SIMILARITY = 0.8  # 与查询词同音
+POPULARITY_WEIGHT = 0.1
+HEADWORD_BONUS = 0.05
+# 每个缺失词的最佳候选都不低于该分数、且领先第二名足够多时才自动改写
+AUTO_REWRITE_SCORE = 0.7
+AUTO_REWRITE_MARGIN = 0.15
+
+_DICTIONARY_CACHE: dict[str, dict[str, tuple[str, ...]]] = {}
+_DICTIONARY_LOCK = threading.Lock()
+
+_HAN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+_TONE_MARKS = "āáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜüńňǹḿɑ"
+_PINYIN_LINE_RE = re.compile(rf"[a-z{_TONE_MARKS}]+(?:[\s、，,/;；]+[a-z{_TONE_MARKS}]+)*")
+_PINYIN_SYLLABLE_RE = re.compile(rf"[a-z{_TONE_MARKS}]+")
+_TONED_RE = re.compile(rf"[{_TONE_MARKS}]")
+
+
+def normalize_pinyin(text: str) -> str:
+    """去掉声调与数字调号、ü 记作 v：“lǚ”“lv3”“Lü” → “lv”"""
+    text = unicodedata.normalize("NFC", text.lower())
+    text = re.sub("[üǖǘǚǜ]", "v", text).replace("ɑ", "a")
+    return "".join(ch for ch in unicodedata.normalize("NFD", text) if "a" <= ch <= "z")
+
+
+def _grams(text):
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein 距离；超过 ``limit`` 时提前返回 ``limit + 1``"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ch_a in enumerate(a, 1):
+        current = [i]
+        for j, ch_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ch_a != ch_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+# ---------------------- 离线构建 ----------------------
+def _headword(title):
+    """页面标题中的字：“礼（禮）”“示例：凶” → “礼”“凶”"""
+    if not title:
+        return None
+    name = title.split("：")[-1].strip()
+    return name[0] if name and _HAN_RE.match(name) else None
+
+
+def _textbook_readings(htmls_dir):
+    """各页标题字在“音”一节中的读音：{汉字: [无声调拼音, ...]}"""
+    from html_extract import extract_document  # 延迟导入 lxml
+
+    readings: dict[str, list[str]] = {}
+    for html_file in sorted(Path(htmls_dir).glob("*.html")):
+        document = extract_document(html_file)
+        headword = _headword(document.title)
+        if headword is None:
+            continue
+        for paragraph in document.paragraphs:
+            paragraph = paragraph.lower()
+            if _PINYIN_LINE_RE.fullmatch(paragraph) and _TONED_RE.search(paragraph):
+                values = readings.setdefault(headword, [])
+                for syllable in _PINYIN_SYLLABLE_RE.findall(paragraph):
+                    key = normalize_pinyin(syllable)
+                    if key and key not in values:
+                        values.append(key)
+                break
+    return readings
+
+
+def _generate_dictionary_readings():
+    try:
+        from pypinyin import Style, pinyin
+    except ImportError:
+        print("[WARN] 未安装 pypinyin，拼音表只包含教材收录的字。")
+        return {}
+
+    readings = {}
+    for code in range(0x4E00, 0x9FA6):
+        ch = chr(code)
+        values = [normalize_pinyin(value) for value in pinyin(ch, style=Style.NORMAL, heteronym=True)[0]]
+        values = tuple(value for value in dict.fromkeys(values) if value)
+        if values:
+            readings[ch] = values
+    return readings
+
+
+def _read_dictionary_readings(path):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        print(f"[WARN] 共享拼音表不存在：{path}，拼音表只包含教材收录的字（请运行 python -m query_suggest build）。")
+        return {}
+
+
+def save_dictionary_readings(path: str | os.PathLike[str] = DEFAULT_PINYIN_PATH) -> dict[str, tuple[str, ...]]:
+    """由 pypinyin 生成 CJK 基本区汉字的读音并保存为共享拼音表（构建时运行）"""
+    readings = _generate_dictionary_readings()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(readings, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    with _DICTIONARY_LOCK:
+        _DICTIONARY_CACHE[str(path)] = readings
+    return readings
+
+
+def dictionary_readings(path: str | None = None) -> dict[str, tuple[str, ...]]:
+    """共享拼音表：CJK 基本区约 2 万字的读音，缺失时为空表
+
+    每个进程只读取一次，由所有教材的纠错索引共享；不计入索引内存预算。
+    """
+    path = str(path or DEFAULT_PINYIN_PATH)
+    readings = _DICTIONARY_CACHE.get(path)
+    if readings is None:
+        with _DICTIONARY_LOCK:
+            readings = _DICTIONARY_CACHE.get(path)
+            if readings is None:
+                readings = _DICTIONARY_CACHE[path] = _read_dictionary_readings(path)
+    return readings
+
+
+def _merge_readings(textbook, pinyin_path=None):
+    """教材读音在前、词典补充的读音在后；其余汉字直接查共享的词典表"""
+    dictionary = dictionary_readings(pinyin_path)
+    merged = {
+        ch: tuple(values) + tuple(value for value in dictionary.get(ch, ()) if value not in values)
+        for ch, values in textbook.items()
+    }
+    return ChainMap(merged, dictionary)
+
+
+def _pinyin_keys(text, readings, primary=False):
+    """词的各种读音串（多音字取组合，最多 ``MAX_PINYIN_KEYS`` 个）；有字缺读音时为空
+
+    ``primary`` 为 True 时每个字只取第一个（最常用的）读音。词表一侧这样登记，
+    避免生僻读音造成误配（如“能”的古音 xióng）；查询一侧仍取全部读音。
+    """
+    per_char = [readings.get(ch) for ch in text]
+    if not per_char or not all(per_char):
+        return []
+    if primary:
+        per_char = [values[:1] for values in per_char]
+    return ["".join(combo) for combo in itertools.islice(itertools.product(*per_char), MAX_PINYIN_KEYS)]
+
+
+def build_suggest_index(
+    index_path: str | None = None,
+    htmls_dir: str | os.PathLike[str] = DEFAULT_HTMLS_DIR,
+    save_path: str | os.PathLike[str] = DEFAULT_SUGGEST_PATH,
+    pinyin_path: str | os.PathLike[str] = DEFAULT_PINYIN_PATH,
+):
+    """由BM25索引的词表与教材拼音构造纠错索引并保存
+
+    同时（重新）生成 ``pinyin_path`` 处的共享拼音表，检索进程从该文件加载。
+    """
+    index_data = load_index(index_path)
+    word_df = index_data["word_df"]
+    terms = sorted(word_df, key=lambda term: (-word_df[term], term))
+
+    textbook_readings = _textbook_readings(htmls_dir)
+    headwords = set(textbook_readings)
+    save_dictionary_readings(pinyin_path)
+    readings = _merge_readings(textbook_readings, pinyin_path)
+
+    grams = defaultdict(list)
+    pinyin_terms = defaultdict(list)
+    headword_ids = set()
+    for term_id, term in enumerate(terms):
+        if not _HAN_RE.search(term):
+            continue  # 拼音碎片、数字等不作为建议
+        for gram in _grams(term):
+            grams[gram].append(term_id)
+        for key in _pinyin_keys(term, readings, primary=True):
+            pinyin_terms[key].append(term_id)
+        if term in headwords:
+            headword_ids.add(term_id)
+
+    data = {
+        "version": SUGGEST_INDEX_VERSION,
+        "terms": terms,
+        "df": [word_df[term] for term in terms],
+        "grams": {gram: tuple(ids) for gram, ids in grams.items()},
+        "textbook_readings": {ch: tuple(values) for ch, values in textbook_readings.items()},
+        "pinyin_terms": {key: tuple(ids) for key, ids in pinyin_terms.items()},
+        "headwords": frozenset(headword_ids),
+    }
+
+    save_path = Path(save_path)
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = save_path.with_name(save_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, save_path)
+    print(
+        f"纠错索引已保存至 {save_path}：{len(terms)} 个词，{len(data['grams'])} 个 n-gram，"
+        f"{len(readings)} 个字的读音（教材收录 {len(headwords)} 个，仅这部分存入索引）"
+    )
+    return data
+
+
+# ---------------------- 在线纠错 ----------------------
+class Candidate(NamedTuple):
+    term: str
+    score: float
+    kind: str  # "edit" 字面相近 / "homophone" 同音 / "pinyin" 拼音输入
+
+
+class Suggestion(NamedTuple):
+    query: str  # 改写后的完整查询
+    score: float
+    corrections: tuple[tuple[str, str], ...]  # (原查询词, 替换词)
+    confident: bool  # 可直接用于自动改写
+
+
+class SuggestIndex:
+    """只读的纠错索引，可在多线程间共享；拼音表只持有教材读音，其余查共享的词典表"""
+
+    def __init__(self, path: str | os.PathLike[str], pinyin_path: str | None = None):
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != SUGGEST_INDEX_VERSION:
+            raise ValueError(f"纠错索引版本不匹配，请重新构建：{path}")
+        self.terms = data["terms"]
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.grams = data["grams"]
+        self.readings = _merge_readings(data["textbook_readings"], pinyin_path)
+        self.pinyin_terms = data["pinyin_terms"]
+        self.headwords = data["headwords"]
+        max_df = max(data["df"], default=1)
+        self.popularity = [math.log1p(df) / math.log1p(max_df) for df in data["df"]]
+
+    def memory_bytes(self) -> int:
+        """估算常驻内存（字节），不含各教材共享的词典读音表"""
+        total = sys.getsizeof(self.terms) + sum(sys.getsizeof(term) for term in self.terms)
+        total += sys.getsizeof(self.term_ids) + sys.getsizeof(self.popularity)
+        for table in (self.grams, self.pinyin_terms, self.readings.maps[0]):
+            total += sys.getsizeof(table) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in table.items())
+        return total + sys.getsizeof(self.headwords)
+
+    def candidates(self, word, limit=5, deadline=None):
+        """词表中与 ``word`` 相近或同音的词，按分数从高到低"""
+        scores: dict[int, tuple[float, str]] = {}
+
+        def offer(term_id, similarity, kind):
+            score = similarity + POPULARITY_WEIGHT * self.popularity[term_id]
+            if term_id in self.headwords:
+                score += HEADWORD_BONUS
+            if term_id not in scores or score > scores[term_id][0]:
+                scores[term_id] = (score, kind)
+
+        if not _HAN_RE.search(word):
+            for term_id in self.pinyin_terms.get(normalize_pinyin(word), ()):
+                offer(term_id, PINYIN_SIMILARITY, "pinyin")
+        else:
+            for key in _pinyin_keys(word, self.readings):
+                for term_id in self.pinyin_terms.get(key, ()):
+                    offer(term_id, HOMOPHONE_SIMILARITY, "homophone")
+
+            overlap = Counter()
+            for gram in _grams(word):
+                overlap.update(self.grams.get(gram, ()))
+            nearest = heapq.nlargest(GRAM_CANDIDATES, overlap.items(), key=lambda item: item[1])
+            for i, (term_id, _) in enumerate(nearest):
+                if deadline is not None and i % DEADLINE_CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+                    break  # 预算用尽：只用已计算的候选
+                term = self.terms[term_id]
+                distance = bounded_edit_distance(word, term, MAX_EDIT_DISTANCE)
+                similarity = 1 - distance / max(len(word), len(term))
+                if distance <= MAX_EDIT_DISTANCE and similarity > 0:
+                    offer(term_id, similarity, "edit")
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1][0])
+        return [Candidate(self.terms[term_id], score, kind) for term_id, (score, kind) in best]
+
+    def suggest(self, query, query_words, limit=5, time_budget=None):
+        """为检索词不在词表中的查询生成改写建议
+
+        ``query_words`` 为检索时得到的查询词（``stats["tokens"]``），只替换其中
+        词表里没有的词，运算符与其余词保持不变。返回按分数排序的
+        ``Suggestion`` 列表；``time_budget``（秒）用尽时返回已得到的建议。
+        """
+        deadline = None if time_budget is None else time.perf_counter() + time_budget
+        missing = [word for word in dict.fromkeys(query_words) if word not in self.term_ids]
+        per_word = {}
+        for word in missing:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            found = self.candidates(word, limit=limit, deadline=deadline)
+            if found:
+                per_word[word] = found
+        if not per_word:
+            return []
+
+        confident = len(per_word) == len(missing) and all(
+            found[0].score >= AUTO_REWRITE_SCORE
+            and (len(found) == 1 or found[0].score - found[1].score >= AUTO_REWRITE_MARGIN)
+            for found in per_word.values()
+        )
+        best = {word: found[0] for word, found in per_word.items()}
+        choices = [best]  # 先取每个词的最佳候选，再逐个词换成次优候选
+        for word, found in per_word.items():
+            for alternative in found[1:]:
+                choices.append({**best, word: alternative})
+
+        pattern = re.compile("|".join(re.escape(word) for word in sorted(per_word, key=len, reverse=True)))
+        suggestions = {}
+        for i, choice in enumerate(choices):
+            rewritten = pattern.sub(lambda match: choice[match.group(0)].term, query)
+            if rewritten in suggestions or rewritten == query:
+                continue
+            suggestions[rewritten] = Suggestion(
+                query=rewritten,
+                score=sum(candidate.score for candidate in choice.values()) / len(choice),
+                corrections=tuple((word, candidate.term) for word, candidate in choice.items()),
+                confident=confident and i == 0,
+            )
+        return sorted(suggestions.values(), key=lambda s: s.score, reverse=True)[:limit]
+
+
+def _read_suggest_index(path: str) -> SuggestIndex:
+    if not Path(path).exists():
+        raise ValueError(f"纠错索引不存在：{path}")
+    return SuggestIndex(path)
+
+
+def load_suggest_index(path: str | None = None) -> SuggestIndex:
+    """加载纠错索引（线程安全、计入索引内存预算）；文件缺失时抛出 ValueError"""
+    return load_cached_resource("suggest", path or DEFAULT_SUGGEST_PATH, _read_suggest_index)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="零结果查询纠错索引的构建与试查")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="由BM25索引与教材拼音构建纠错索引")
+    build.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    build.add_argument("--htmls", default=DEFAULT_HTMLS_DIR)
+    build.add_argument("--out", default=DEFAULT_SUGGEST_PATH)
+    build.add_argument("--pinyin", default=DEFAULT_PINYIN_PATH, help="所有教材共享的拼音表")
+
+    query = sub.add_parser("query", help="查看查询的改写建议")
+    query.add_argument("query")
+    query.add_argument("--index", default=DEFAULT_SUGGEST_PATH)
+    query.add_argument("--budget-ms", type=float, default=50)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build_suggest_index(args.index, args.htmls, args.out, args.pinyin)
+        return
+
+    query_words = tokenize(args.query, load_stopwords())
+    suggest_index = load_suggest_index(args.index)
+    started = time.perf_counter()
+    suggestions = suggest_index.suggest(args.query, query_words, time_budget=args.budget_ms / 1000)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for i, suggestion in enumerate(suggestions, 1):
+        mark = "（自动改写）" if suggestion.confident else ""
+        print(f"{i}. {suggestion.query}  分数：{suggestion.score:.3f}{mark}")
+    print(f"共 {len(suggestions)} 条建议，耗时 {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
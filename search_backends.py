@@ -0,0 +1,398 @@
+"""可插拔的检索后端：统一的 build / open / search / stats 接口。
+
+* ``bm25``：现有的 pickle 倒排索引（``search_engine``），整体加载到内存
+* ``sharded``：按文档分片的索引（``sharded_index``），每个分片一个进程并行检索
+* ``sqlite``：SQLite FTS5 全文索引，文本预先用 jieba 分词后以空格连接写入；
+  索引留在磁盘上，打开几乎零开销，多个线程/进程可安全并发只读
+
+应用通过 ``create_app`` 的 ``SEARCH_BACKEND`` / ``SEARCH_BACKEND_PATH`` 选择后端。
+对比各后端的构建耗时、内存与查询延迟::
+
+    python -m search_backends bench --backends bm25 sqlite sharded
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from search_engine import (
+    BASE_DIR,
+    DEFAULT_HTMLS_DIR,
+    DEFAULT_INDEX_PATH,
+    DEFAULT_SHARDS_DIR,
+    DEFAULT_TITLE_WEIGHT,
+    build_bm25_index,
+    build_sharded_index,
+    iter_document_fields,
+    load_cached_resource,
+    load_index,
+    load_stopwords,
+    parse_query,
+    retrieve,
+)
+
+
+DEFAULT_SQLITE_PATH = os.getenv("SQLITE_INDEX_PATH", str(BASE_DIR / "search_index.sqlite3"))
+
+
+class SearchBackend:
+    """检索后端接口。``search`` 返回 ``[(doc_id, score), ...]``，分数越大越相关。
+
+    ``time_budget``（秒）与 ``max_candidates`` 是尽力而为的上限：后端无法在
+    预算内给出完整结果时返回已有结果，并置 ``stats["partial"] = True``。
+    """
+
+    name = ""
+    default_location = ""
+
+    def __init__(self, location: str, stopwords_path: str | None = None) -> None:
+        self.location = location
+        self.stopwords_path = stopwords_path
+
+    @classmethod
+    def build(cls, location: str | None = None, htmls_dir=DEFAULT_HTMLS_DIR, stopwords_path=None, **options) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    def open(cls, location: str | None = None, stopwords_path: str | None = None) -> "SearchBackend":
+        return cls(location or cls.default_location, stopwords_path)
+
+    def search(
+        self,
+        query: str,
+        top_n: int = 10,
+        default_operator: str = "OR",
+        stats: dict | None = None,
+        time_budget: float | None = None,
+        max_candidates: int | None = None,
+    ):
+        raise NotImplementedError
+
+    def stats(self) -> dict[str, Any]:
+        raise NotImplementedError
+
+    def memory_bytes(self) -> int:
+        """计入索引内存预算的估算字节数；bm25 的索引快照由 ``load_index`` 单独计入"""
+        return 0
+
+    def close(self) -> None:
+        """释放后端持有的进程、连接等资源（被缓存淘汰时调用）"""
+
+
+# ---------------------- BM25（pickle） ----------------------
+class BM25Backend(SearchBackend):
+    name = "bm25"
+    default_location = DEFAULT_INDEX_PATH
+
+    @classmethod
+    def build(cls, location=None, htmls_dir=DEFAULT_HTMLS_DIR, stopwords_path=None, **options):
+        build_bm25_index(htmls_dir=htmls_dir, stopwords_path=stopwords_path,
+                         save_path=location or cls.default_location, **options)
+
+    @classmethod
+    def open(cls, location=None, stopwords_path=None):
+        backend = cls(location or cls.default_location, stopwords_path)
+        load_index(backend.location)
+        return backend
+
+    def search(self, query, top_n=10, default_operator="OR", stats=None, time_budget=None, max_candidates=None):
+        return retrieve(query, index_path=self.location, stopwords_path=self.stopwords_path,
+                        top_n=top_n, default_operator=default_operator, stats=stats,
+                        time_budget=time_budget, max_candidates=max_candidates)
+
+    def stats(self):
+        index_data = load_index(self.location)
+        return {
+            "backend": self.name,
+            "documents": index_data["total_docs"],
+            "terms": len(index_data["inverted_index"]),
+            "bytes_on_disk": Path(self.location).stat().st_size,
+        }
+
+
+# ---------------------- 分片索引 ----------------------
+class ShardedBackend(SearchBackend):
+    name = "sharded"
+    default_location = DEFAULT_SHARDS_DIR
+
+    def __init__(self, location, stopwords_path=None):
+        from sharded_index import ShardedRetriever  # 进程池与 HTTP 客户端仅分片后端需要
+
+        super().__init__(location, stopwords_path)
+        self.retriever = ShardedRetriever(location, stopwords_path=stopwords_path)
+
+    @classmethod
+    def build(cls, location=None, htmls_dir=DEFAULT_HTMLS_DIR, stopwords_path=None, **options):
+        build_sharded_index(htmls_dir=htmls_dir, stopwords_path=stopwords_path,
+                            save_dir=location or cls.default_location, **options)
+
+    def search(self, query, top_n=10, default_operator="OR", stats=None, time_budget=None, max_candidates=None):
+        return self.retriever.retrieve(
+            query, top_n=top_n, default_operator=default_operator, stats=stats, time_budget=time_budget
+        )
+
+    def stats(self):
+        global_stats = self.retriever.global_stats
+        return {
+            "backend": self.name,
+            "documents": global_stats["total_docs"],
+            "terms": len(global_stats["word_df"]),
+            "shards": global_stats["num_shards"],
+            "bytes_on_disk": sum(p.stat().st_size for p in Path(self.location).glob("*.pkl")),
+        }
+
+    def memory_bytes(self):
+        # 全局统计量常驻本进程；各分片常驻在各自的进程中，按分片文件大小粗略计入
+        word_df = self.retriever.global_stats["word_df"]
+        total = sys.getsizeof(word_df) + sum(sys.getsizeof(word) for word in word_df)
+        return total + sum(Path(path).stat().st_size for path in self.retriever.shard_paths)
+
+    def close(self):
+        self.retriever.close(wait=False)  # 淘汰发生在检索线程中，不等待分片进程退出
+
+
+# ---------------------- SQLite FTS5 ----------------------
+def _fts_expression(node):
+    """把 search_engine.parse_query 的语法树翻译成 FTS5 查询表达式"""
+    if node is None:
+        return None
+    kind = node[0]
+    if kind == "term":
+        return '"' + node[1].replace('"', '""') + '"'
+    if kind == "or":
+        parts = [p for p in (_fts_expression(child) for child in node[1]) if p]
+        return "(" + " OR ".join(parts) + ")" if parts else None
+    # 纯排除的分组（如 a AND (NOT b)）并入本层的 NOT 链，与 evaluate_query 相同
+    excluded = [c[1] for c in node[1] if c[0] == "not"]
+    included = []
+    for child in node[1]:
+        if child[0] == "not":
+            continue
+        if child[0] == "and" and all(c[0] == "not" for c in child[1]):
+            excluded.extend(c[1] for c in child[1])
+        else:
+            included.append(child)
+    positive = [p for p in (_fts_expression(c) for c in included) if p]
+    negative = [p for p in (_fts_expression(c) for c in excluded) if p]
+    if not positive:
+        return None  # FTS5 不支持纯排除查询
+    expression = "(" + " AND ".join(positive) + ")"
+    for part in negative:
+        expression = f"({expression} NOT {part})"
+    return expression
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """SQLite FTS5 后端：rowid 即文档ID，title 列权重与 BM25 后端的 title 权重一致"""
+
+    name = "sqlite"
+    default_location = DEFAULT_SQLITE_PATH
+
+    def __init__(self, location, stopwords_path=None):
+        super().__init__(location, stopwords_path)
+        if not Path(location).exists():
+            raise ValueError(f"SQLite 索引不存在：{location}")
+        self._local = threading.local()
+        meta = dict(self._connection().execute("SELECT key, value FROM meta").fetchall())
+        self.title_weight = float(meta.get("title_weight", DEFAULT_TITLE_WEIGHT))
+
+    def _connection(self) -> sqlite3.Connection:
+        # 每个线程一个只读连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{Path(self.location).as_posix()}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    @classmethod
+    def build(cls, location=None, htmls_dir=DEFAULT_HTMLS_DIR, stopwords_path=None,
+              start=1, end=107, title_weight=DEFAULT_TITLE_WEIGHT):
+        location = Path(location or cls.default_location)
+        location.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = location.with_name(location.name + ".tmp")
+        tmp_path.unlink(missing_ok=True)
+
+        conn = sqlite3.connect(tmp_path)
+        with conn:
+            conn.execute("CREATE VIRTUAL TABLE docs USING fts5(title, body, tokenize='unicode61')")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.executemany(
+                "INSERT INTO docs(rowid, title, body) VALUES (?, ?, ?)",
+                (
+                    (doc_id, " ".join(title_words), " ".join(p_words))
+                    for doc_id, title_words, p_words in iter_document_fields(htmls_dir, stopwords_path, start, end)
+                    if title_words or p_words
+                ),
+            )
+            conn.execute("INSERT INTO meta VALUES ('title_weight', ?)", (str(title_weight),))
+            conn.execute("INSERT INTO docs(docs) VALUES ('optimize')")
+        conn.close()
+        os.replace(tmp_path, location)  # 原子替换，正在读的进程不受影响
+        print(f"SQLite 索引已保存至 {location}")
+
+    def search(self, query, top_n=10, default_operator="OR", stats=None, time_budget=None, max_candidates=None):
+        started = time.perf_counter()
+        query_tree, query_words = parse_query(query, load_stopwords(self.stopwords_path), default_operator)
+        expression = _fts_expression(query_tree)
+        parsed = time.perf_counter()
+        if stats is not None:
+            stats.update(tokens=query_words, candidates=0, partial=False,
+                         timings={"parse": (parsed - started) * 1000})
+        if not query_words or not expression:
+            return []
+
+        conn = self._connection()
+        if time_budget is not None:
+            # FTS5 排序前需要扫描全部匹配行，超时只能中断查询并返回空结果
+            deadline = started + time_budget
+            conn.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+        try:
+            rows = conn.execute(
+                "SELECT rowid, -bm25(docs, ?, 1.0) AS score FROM docs WHERE docs MATCH ? "
+                "ORDER BY score DESC LIMIT ?",
+                (self.title_weight, expression, top_n),
+            ).fetchall()
+        except sqlite3.OperationalError as exc:
+            if "interrupted" not in str(exc):
+                raise
+            rows = []
+            if stats is not None:
+                stats["partial"] = True
+        finally:
+            if time_budget is not None:
+                conn.set_progress_handler(None, 0)
+        if stats is not None:
+            stats["timings"]["score"] = (time.perf_counter() - parsed) * 1000
+        return [(doc_id, score) for doc_id, score in rows if score > 0]
+
+    def stats(self):
+        conn = self._connection()
+        return {
+            "backend": self.name,
+            "documents": conn.execute("SELECT count(*) FROM docs").fetchone()[0],
+            "bytes_on_disk": Path(self.location).stat().st_size,
+        }
+
+
+BACKENDS: dict[str, type[SearchBackend]] = {
+    BM25Backend.name: BM25Backend,
+    ShardedBackend.name: ShardedBackend,
+    SQLiteFTS5Backend.name: SQLiteFTS5Backend,
+}
+
+def open_backend(name: str, location: str | None = None, stopwords_path: str | None = None) -> SearchBackend:
+    """按名称打开后端（线程安全、每个进程缓存一份，计入索引内存预算）
+
+    被 LRU 淘汰的后端会被 ``close()``（如关闭分片进程池），下次访问时重新打开。
+    """
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError as exc:
+        raise ValueError(f"未知的检索后端：{name}（可选：{', '.join(BACKENDS)}）") from exc
+    location = location or backend_cls.default_location
+    return load_cached_resource(
+        "backend", (name, location, stopwords_path), lambda key: backend_cls.open(key[1], key[2])
+    )
+
+
+# ---------------------- 基准测试 ----------------------
+def _rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return 0
+
+
+def _bench_backend(name, location, htmls_dir, queries):
+    """在独立进程中测量单个后端，避免缓存与内存统计互相干扰"""
+    backend_cls = BACKENDS[name]
+    started = time.perf_counter()
+    backend_cls.build(location, htmls_dir=htmls_dir)
+    build_seconds = time.perf_counter() - started
+
+    rss_before = _rss_kb()
+    tracemalloc.start()
+    started = time.perf_counter()
+    backend = backend_cls.open(location)
+    open_ms = (time.perf_counter() - started) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _rss_kb()
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        backend.search(query, top_n=10)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        **backend.stats(),
+        "build_s": build_seconds,
+        "open_ms": open_ms,
+        "python_heap_kb": peak // 1024,
+        "rss_delta_kb": rss_after - rss_before,
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+    }
+
+
+def benchmark(backends, out_dir, htmls_dir=DEFAULT_HTMLS_DIR, queries=None, n_queries=200, seed=0):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if not queries:
+        # 默认从现有索引的词表中随机抽取单词与双词查询
+        vocab = sorted(load_index()["inverted_index"])
+        rng = random.Random(seed)
+        queries = [" ".join(rng.sample(vocab, rng.choice((1, 2)))) for _ in range(n_queries)]
+
+    locations = {"bm25": out_dir / "bm25_index.pkl", "sharded": out_dir / "shards", "sqlite": out_dir / "index.sqlite3"}
+    results = []
+    for name in backends:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(_bench_backend, name, str(locations[name]), htmls_dir, queries).result())
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="检索后端的构建与基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="构建指定后端的索引")
+    build.add_argument("backend", choices=sorted(BACKENDS))
+    build.add_argument("--out", default=None, help="索引位置，缺省为该后端的默认路径")
+
+    bench = sub.add_parser("bench", help="对比各后端的构建耗时、内存与查询延迟")
+    bench.add_argument("--backends", nargs="+", default=sorted(BACKENDS), choices=sorted(BACKENDS))
+    bench.add_argument("--out", default=str(BASE_DIR / "bench_indexes"))
+    bench.add_argument("--queries", help="查询文件（每行一个查询）")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        BACKENDS[args.backend].build(args.out)
+        return
+
+    queries = None
+    if args.queries:
+        queries = [line.strip() for line in Path(args.queries).read_text(encoding="utf-8").splitlines() if line.strip()]
+    results = benchmark(args.backends, args.out, queries=queries)
+    print(f"\n{'后端':<8} {'构建(s)':>8} {'打开(ms)':>9} {'堆内存(KB)':>11} {'RSS增量(KB)':>12} "
+          f"{'磁盘(KB)':>9} {'p50(ms)':>8} {'p95(ms)':>8}")
+    for r in results:
+        print(f"{r['backend']:<8} {r['build_s']:>8.2f} {r['open_ms']:>9.2f} {r['python_heap_kb']:>11} "
+              f"{r['rss_delta_kb']:>12} {r['bytes_on_disk'] // 1024:>9} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,228 @@
+"""BM25 检索引擎：索引构建、加载与检索。
+
+线程安全：停用词表与索引按路径各自“单飞”加载（同一路径并发的冷启动只会
+反序列化一次），加载完成后以只读快照的形式整体发布到缓存，之后从不原地
+修改。因此 ``load_stopwords``、``load_index``、``tokenize`` 与 ``retrieve``
+可在 gunicorn ``gthread`` 等多线程 worker 中并发调用，同一进程内所有线程共享
+同一份索引；``reload_index`` 以原子替换的方式发布新快照，正在检索的线程继续
+使用旧快照直至返回。调用方不得修改返回的停用词集合或索引内容。
+以上保证由 ``tests/test_thread_safety.py`` 检查。
+
+一个进程可同时服务多套教材（多个索引文件）：常驻索引按最近使用顺序淘汰，
+估算内存之和不超过 ``INDEX_MEMORY_BUDGET_MB``，被淘汰的索引在下次检索时重新加载。
+语义索引、检索后端与纠错索引等按教材划分的资源经 ``load_cached_resource``
+计入同一预算。
+
+冷启动：jieba 与 lxml 在首次分词 / 解析HTML时才导入。jieba 的前缀词典
+（约 50 万项）是启动时最大的开销，``save_tokenizer_snapshot`` 可把加载好的
+词典保存为 pickle 快照，``get_tokenizer`` 优先从快照恢复。
+"""
+
 import os
+import re
 import math
 import pickle
-from collections import defaultdict
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
 from pathlib import Path
+from types import MappingProxyType
+
 
-import jieba
-from bs4 import BeautifulSoup
+def _env_weight(name, default):
+    """读取权重类环境变量：接受小数（调参工具会给出如 7.5 的值），整数值仍保持为 int"""
+    value = float(os.getenv(name, default))
+    return int(value) if value.is_integer() else value
 
 
 BASE_DIR = Path(__file__).resolve().parent
 DEFAULT_HTMLS_DIR = os.getenv("HTMLS_DIR", str(BASE_DIR / "htmls"))
 DEFAULT_STOPWORDS_PATH = os.getenv("STOPWORDS_PATH", str(BASE_DIR / "data" / "stopwords.txt"))
 DEFAULT_INDEX_PATH = os.getenv("INDEX_PATH", str(BASE_DIR / "bm25_index.pkl"))
-
-_STOPWORDS_CACHE: dict[str, set[str]] = {}
-_INDEX_CACHE: dict[str, dict] = {}
+DEFAULT_SHARDS_DIR = os.getenv("SHARDS_DIR", str(BASE_DIR / "bm25_shards"))
+DEFAULT_TITLE_WEIGHT = _env_weight("TITLE_WEIGHT", "20")
+DEFAULT_K1 = float(os.getenv("BM25_K1", "1.2"))
+DEFAULT_B = float(os.getenv("BM25_B", "0.75"))
+DEFAULT_TOKENIZER_SNAPSHOT = os.getenv("TOKENIZER_SNAPSHOT_PATH", str(BASE_DIR / "tokenizer_snapshot.pkl"))
+DEFAULT_INDEX_MEMORY_BUDGET = int(float(os.getenv("INDEX_MEMORY_BUDGET_MB", "512")) * 1024 * 1024)
+
+
+class _IndexCache:
+    """按最近使用顺序淘汰的索引缓存，常驻索引的估算内存之和不超过 ``budget`` 字节
+
+    单个索引超出预算时仍会保留（否则无法检索），但其余索引全部被淘汰。
+    被淘汰的快照仍可被正在检索的线程继续使用，返回后由垃圾回收释放；
+    提供 ``close()`` 的资源（如分片进程池）在淘汰后、锁外关闭。
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._data: OrderedDict[object, object] = OrderedDict()
+        self._sizes: dict[object, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        size = estimate_resource_bytes(value)
+        with self._lock:
+            replaced = self._data.get(key)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._sizes[key] = size
+            evicted = self._evict()
+        if replaced is not None and replaced is not value:
+            evicted.append(replaced)
+        _close_resources(evicted)
+
+    def _evict(self):
+        evicted = []
+        while len(self._data) > 1 and sum(self._sizes.values()) > self.budget:
+            oldest, value = self._data.popitem(last=False)
+            del self._sizes[oldest]
+            evicted.append(value)
+        return evicted
+
+    def set_budget(self, budget: int):
+        with self._lock:
+            self.budget = budget
+            evicted = self._evict()
+        _close_resources(evicted)
+
+    def resident(self) -> dict[object, int]:
+        """{索引路径或 (资源类型, 键): 估算字节数}，按最近使用从旧到新排列"""
+        with self._lock:
+            return {key: self._sizes[key] for key in self._data}
+
+
+_STOPWORDS_CACHE: dict[str, frozenset[str]] = {}
+_INDEX_CACHE = _IndexCache(DEFAULT_INDEX_MEMORY_BUDGET)
+_TOKENIZER_CACHE: dict[str, object] = {}
+_LOAD_LOCKS: dict[tuple[str, str], threading.Lock] = {}
+_LOAD_LOCKS_GUARD = threading.Lock()
+DEADLINE_CHECK_INTERVAL = 256  # 打分时每隔多少个文档检查一次时间预算
 
 
 # ---------------------- 工具函数（复用之前的解析和预处理逻辑） ----------------------
-def load_stopwords(stopwords_path: str | None = None):
-    """加载停用词表，带简单缓存；若缺失则回退为空集合并给出警告。"""
-    path = stopwords_path or DEFAULT_STOPWORDS_PATH
-    if path in _STOPWORDS_CACHE:
-        return _STOPWORDS_CACHE[path]
-
+def _single_flight(cache, kind, key, loader):
+    """缓存未命中时，保证同一 key 只有一个线程执行 loader，其余线程等待其结果"""
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    with _LOAD_LOCKS_GUARD:
+        lock = _LOAD_LOCKS.setdefault((kind, key), threading.Lock())
+    with lock:
+        value = cache.get(key)  # 等锁期间可能已由其他线程加载完成
+        if value is None:
+            value = loader(key)
+            cache[key] = value  # 完整构造后再发布，读者不会看到半成品
+    return value
+
+
+def _read_stopwords(path):
     try:
         with open(path, "r", encoding="utf-8") as f:
-            stopwords = set(f.read().splitlines())
+            return frozenset(f.read().splitlines())
     except FileNotFoundError:
         # 回退策略：缺少停用词文件时，以空集合继续运行，避免服务直接崩溃
         print(f"[WARN] 停用词文件不存在：{path}，将以空停用词集合继续运行。")
-        stopwords = set()
+        return frozenset()
 
-    _STOPWORDS_CACHE[path] = stopwords
-    return stopwords
+
+def load_stopwords(stopwords_path: str | None = None):
+    """加载停用词表（线程安全、带缓存）；若缺失则回退为空集合并给出警告。"""
+    path = stopwords_path or DEFAULT_STOPWORDS_PATH
+    return _single_flight(_STOPWORDS_CACHE, "stopwords", path, _read_stopwords)
+
+
+def _read_tokenizer_snapshot(path, jieba_version, dictionary):
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if snapshot.get("jieba") != jieba_version or snapshot.get("dictionary") != dictionary:
+        print(f"[WARN] 分词词典快照与当前 jieba 不匹配：{path}，将重新加载词典。")
+        return None
+    return snapshot
+
+
+def _load_tokenizer(snapshot_path):
+    import jieba  # 延迟导入：只有需要分词的进程才付出导入与加载词典的代价
+
+    tokenizer = jieba.dt
+    snapshot = _read_tokenizer_snapshot(snapshot_path, jieba.__version__, tokenizer.dictionary)
+    if snapshot is None:
+        tokenizer.initialize()
+    else:
+        with tokenizer.lock:
+            tokenizer.FREQ, tokenizer.total = snapshot["freq"], snapshot["total"]
+            tokenizer.initialized = True
+    return tokenizer
+
+
+def get_tokenizer(snapshot_path: str | None = None):
+    """返回已加载词典的 jieba 分词器（线程安全，只加载一次）
+
+    ``snapshot_path``（缺省为 ``TOKENIZER_SNAPSHOT_PATH``）存在且与当前 jieba
+    版本匹配时直接恢复前缀词典，否则按 jieba 的常规流程构建或读取其缓存。
+    """
+    snapshot_path = snapshot_path or DEFAULT_TOKENIZER_SNAPSHOT
+    return _single_flight(_TOKENIZER_CACHE, "tokenizer", "jieba", lambda _: _load_tokenizer(snapshot_path))
+
+
+def save_tokenizer_snapshot(path: str | os.PathLike[str] = DEFAULT_TOKENIZER_SNAPSHOT) -> Path:
+    """把 jieba 的前缀词典保存为 pickle 快照，供 ``get_tokenizer`` 快速恢复"""
+    import jieba
+
+    tokenizer = jieba.dt
+    tokenizer.initialize()
+    snapshot = {
+        "jieba": jieba.__version__,
+        "dictionary": tokenizer.dictionary,
+        "freq": tokenizer.FREQ,
+        "total": tokenizer.total,
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
 
 
 def tokenize(text, stopwords):
     """中文分词并过滤停用词"""
     if not text:
         return []
-    words = jieba.cut(text, cut_all=False)  # 精确分词
+    words = get_tokenizer().cut(text, cut_all=False)  # 精确分词
     return [word for word in words if word.strip() and word not in stopwords]
 
 
 # ---------------------- 索引构建与保存（复用并完善） ----------------------
-def build_bm25_index(
+def iter_document_fields(
     htmls_dir: str | os.PathLike[str] = DEFAULT_HTMLS_DIR,
     stopwords_path: str | None = None,
     start: int = 1,
     end: int = 107,
-    save_path: str | os.PathLike[str] = DEFAULT_INDEX_PATH,
+    timings: dict | None = None,
 ):
-    """构建BM25索引并保存为pkl文件"""
-    stopwords = load_stopwords(stopwords_path)
-    inverted_index = defaultdict(dict)  # {word: {doc_id: 加权词频}}
-    doc_lengths = {}  # {doc_id: 原始长度}
-    word_df = defaultdict(int)  # {word: 文档频率}
-    total_docs = 0  # 有效文档数
+    """逐个解析HTML，产出 (doc_id, title分词, p分词)，供索引构建与调参工具复用
+
+    传入 ``timings`` 字典时，写入每个文档的HTML抽取耗时（秒）。
+    """
+    from html_extract import extract_document  # 延迟导入 lxml，检索进程无需加载
 
+    stopwords = load_stopwords(stopwords_path)
     htmls_dir = Path(htmls_dir)
 
     for doc_id in range(start, end + 1):
@@ -67,25 +231,36 @@ def build_bm25_index(
             print(f"跳过不存在的文件：{file_path}")
             continue
 
-        # 解析HTML提取title和p标签
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                soup = BeautifulSoup(f.read(), "lxml")
-        except Exception:
-            with open(file_path, "r", encoding="gbk", errors="ignore") as f:
-                soup = BeautifulSoup(f.read(), "lxml")
+        # 单次流式解析提取title和p标签
+        doc = extract_document(file_path)
+        if timings is not None:
+            timings[doc_id] = doc.seconds
 
-        title = soup.title.get_text(strip=True) if soup.title else ""
-        p_texts = [p.get_text(strip=True) for p in soup.find_all('p') if p.get_text(strip=True)]
-        p_text = " ".join(p_texts)
+        title = doc.title or ""
+        p_text = " ".join(p for p in doc.paragraphs if p)
 
-        # 计算加权词频（title权重20，p权重1）
-        title_words = tokenize(title, stopwords)
-        p_words = tokenize(p_text, stopwords)
+        yield doc_id, tokenize(title, stopwords), tokenize(p_text, stopwords)
 
+
+def collect_index_data(
+    htmls_dir: str | os.PathLike[str] = DEFAULT_HTMLS_DIR,
+    stopwords_path: str | None = None,
+    start: int = 1,
+    end: int = 107,
+    title_weight: float = DEFAULT_TITLE_WEIGHT,
+):
+    """解析HTML并统计倒排表、文档长度与全局统计量（不落盘）"""
+    inverted_index = defaultdict(dict)  # {word: {doc_id: 加权词频}}
+    doc_lengths = {}  # {doc_id: 原始长度}
+    word_df = defaultdict(int)  # {word: 文档频率}
+    total_docs = 0  # 有效文档数
+    timings = {}  # {doc_id: HTML抽取耗时}
+
+    for doc_id, title_words, p_words in iter_document_fields(htmls_dir, stopwords_path, start, end, timings):
+        # 计算加权词频（title权重默认20，p权重1）
         weighted_tf = defaultdict(int)
         for word in title_words:
-            weighted_tf[word] += 20  # title权重
+            weighted_tf[word] += title_weight  # title权重
         for word in p_words:
             weighted_tf[word] += 1   # p标签权重
 
@@ -99,30 +274,103 @@ def build_bm25_index(
             inverted_index[word][doc_id] = tf
             word_df[word] += 1  # 文档频率（去重）
 
-        print(f"已处理文档 {doc_id}/{end}")
+        print(f"已处理文档 {doc_id}/{end}（解析 {timings[doc_id] * 1000:.1f} ms）")
+
+    if timings:
+        slowest = max(timings, key=timings.get)
+        print(
+            f"HTML解析共 {sum(timings.values()):.2f} s，平均 {sum(timings.values()) / len(timings) * 1000:.1f} ms/文档，"
+            f"最慢：文档 {slowest}（{timings[slowest] * 1000:.1f} ms）"
+        )
 
     # 计算平均文档长度
     avg_len = sum(doc_lengths.values()) / total_docs if total_docs else 0
 
-    # 保存索引数据（过程性文件）
-    index_data = {
+    return {
         "inverted_index": dict(inverted_index),
         "word_df": dict(word_df),
         "doc_lengths": doc_lengths,
         "total_docs": total_docs,
         "avg_doc_length": avg_len
     }
+
+
+def build_bm25_index(
+    htmls_dir: str | os.PathLike[str] = DEFAULT_HTMLS_DIR,
+    stopwords_path: str | None = None,
+    start: int = 1,
+    end: int = 107,
+    save_path: str | os.PathLike[str] = DEFAULT_INDEX_PATH,
+    title_weight: float = DEFAULT_TITLE_WEIGHT,
+):
+    """构建BM25索引并保存为pkl文件"""
+    index_data = collect_index_data(htmls_dir, stopwords_path, start, end, title_weight)
+
+    # 保存索引数据（过程性文件）
     save_path = Path(save_path)
     save_path.parent.mkdir(parents=True, exist_ok=True)
 
     with open(save_path, "wb") as f:
         pickle.dump(index_data, f)
-    print(f"索引已保存至 {save_path}，共包含 {total_docs} 个文档")
+    print(f"索引已保存至 {save_path}，共包含 {index_data['total_docs']} 个文档")
     return index_data
 
 
+def build_sharded_index(
+    htmls_dir: str | os.PathLike[str] = DEFAULT_HTMLS_DIR,
+    stopwords_path: str | None = None,
+    start: int = 1,
+    end: int = 107,
+    num_shards: int = 4,
+    save_dir: str | os.PathLike[str] = DEFAULT_SHARDS_DIR,
+    title_weight: float = DEFAULT_TITLE_WEIGHT,
+):
+    """按文档划分N个分片保存，并额外保存全局统计表。
+
+    目录结构：``global.pkl``（word_df/total_docs/avg_doc_length/num_shards）与
+    ``shard-<i>.pkl``（该分片文档的倒排表与文档长度）。打分时统一使用全局统计量，
+    因此分片检索合并后的分数与单体索引完全一致。
+    """
+    index_data = collect_index_data(htmls_dir, stopwords_path, start, end, title_weight)
+    save_dir = Path(save_dir)
+    save_dir.mkdir(parents=True, exist_ok=True)
+
+    shards = [{"inverted_index": defaultdict(dict), "doc_lengths": {}} for _ in range(num_shards)]
+    for doc_id, doc_len in index_data["doc_lengths"].items():
+        shards[doc_id % num_shards]["doc_lengths"][doc_id] = doc_len
+    for word, postings in index_data["inverted_index"].items():
+        for doc_id, tf in postings.items():
+            shards[doc_id % num_shards]["inverted_index"][word][doc_id] = tf
+
+    for i, shard in enumerate(shards):
+        shard["inverted_index"] = dict(shard["inverted_index"])
+        with open(save_dir / f"shard-{i}.pkl", "wb") as f:
+            pickle.dump(shard, f)
+
+    global_stats = {
+        "word_df": index_data["word_df"],
+        "total_docs": index_data["total_docs"],
+        "avg_doc_length": index_data["avg_doc_length"],
+        "num_shards": num_shards,
+    }
+    with open(save_dir / "global.pkl", "wb") as f:
+        pickle.dump(global_stats, f)
+    print(f"分片索引已保存至 {save_dir}，共 {num_shards} 个分片、{index_data['total_docs']} 个文档")
+    return global_stats
+
+
 # ---------------------- 检索功能实现 ----------------------
-def bm25_score(query_words, doc_id, index_data, k1=1.2, b=0.75):
+def bm25_idf(df, total_docs):
+    """计算IDF（逆文档频率）"""
+    return math.log((total_docs - df + 0.5) / (df + 0.5) + 1)
+
+
+def bm25_tf_part(tf, doc_len, avg_len, k1=DEFAULT_K1, b=DEFAULT_B):
+    """计算BM25中的TF部分"""
+    return (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_len / avg_len))
+
+
+def bm25_score(query_words, doc_id, index_data, k1=DEFAULT_K1, b=DEFAULT_B):
     """计算单个文档与查询的BM25分数"""
     inverted_index = index_data["inverted_index"]
     word_df = index_data["word_df"]
@@ -144,55 +392,428 @@ def bm25_score(query_words, doc_id, index_data, k1=1.2, b=0.75):
         # 词的文档频率
         df = word_df[word]
         # 计算IDF（逆文档频率）
-        idf = math.log((total_docs - df + 0.5) / (df + 0.5) + 1)
+        idf = bm25_idf(df, total_docs)
         # 计算BM25中的TF部分
-        tf_part = (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_len / avg_len))
+        tf_part = bm25_tf_part(tf, doc_len, avg_len, k1, b)
         # 累加分数
         score += idf * tf_part
     return score
 
 
+def _read_index(index_path):
+    try:
+        with open(index_path, "rb") as f:
+            index_data = pickle.load(f)
+    except FileNotFoundError as exc:
+        raise ValueError(f"索引文件不存在：{index_path}") from exc
+    # 布尔检索用的升序文档ID表，随快照一次性生成
+    index_data["sorted_postings"] = {
+        word: tuple(sorted(postings)) for word, postings in index_data["inverted_index"].items()
+    }
+    return MappingProxyType(index_data)  # 只读快照
+
+
+def _close_resources(resources):
+    for resource in resources:
+        close = getattr(resource, "close", None)
+        if close is not None:
+            close()
+
+
+def estimate_index_bytes(index_data) -> int:
+    """粗略估算索引快照占用的内存（字节），偏保守"""
+    total = 0
+    for key in ("inverted_index", "sorted_postings"):
+        table = index_data[key]
+        total += sys.getsizeof(table) + sum(sys.getsizeof(postings) for postings in table.values())
+    total += sum(sys.getsizeof(word) for word in index_data["inverted_index"])
+    total += sys.getsizeof(index_data["word_df"]) + sys.getsizeof(index_data["doc_lengths"])
+    return total
+
+
+def estimate_resource_bytes(resource) -> int:
+    """资源的估算内存：提供 ``memory_bytes()`` 的对象自行估算，其余按索引快照估算"""
+    memory_bytes = getattr(resource, "memory_bytes", None)
+    if memory_bytes is not None:
+        return memory_bytes()
+    return estimate_index_bytes(resource)
+
+
+def set_index_memory_budget(budget_bytes: int) -> None:
+    """调整常驻索引的内存预算，超出部分立即按LRU淘汰"""
+    _INDEX_CACHE.set_budget(budget_bytes)
+
+
+def resident_indexes() -> dict[object, int]:
+    """当前常驻内存的索引（键为路径）与其他资源（键为 (资源类型, 键)）及其估算大小"""
+    return _INDEX_CACHE.resident()
+
+
+def load_index(index_path: str | None = None):
+    """加载索引快照（线程安全、LRU缓存），并发冷启动时只反序列化一次"""
+    index_path = index_path or DEFAULT_INDEX_PATH
+    return _single_flight(_INDEX_CACHE, "index", index_path, _read_index)
+
+
+def load_cached_resource(kind: str, key, loader):
+    """在索引内存预算内加载并缓存按教材划分的资源（线程安全、LRU、单飞加载）
+
+    ``loader(key)`` 返回的对象须提供 ``memory_bytes()``，被淘汰时若有 ``close()``
+    则调用之；之后再次访问会重新加载。
+    """
+    return _single_flight(_INDEX_CACHE, kind, (kind, key), lambda _: loader(key))
+
+
+def reload_index(index_path: str | None = None):
+    """重新读取索引文件并原子替换缓存中的快照，用于重建索引后热更新"""
+    index_path = index_path or DEFAULT_INDEX_PATH
+    with _LOAD_LOCKS_GUARD:
+        lock = _LOAD_LOCKS.setdefault(("index", index_path), threading.Lock())
+    with lock:
+        index_data = _read_index(index_path)
+        _INDEX_CACHE[index_path] = index_data
+    return index_data
+
+
+# ---------------------- 布尔查询 ----------------------
+# 语法：AND / OR / NOT（大写）、+必含词、-排除词、括号分组；相邻词之间使用默认运算符。
+# 语法树节点：("term", word)、("and", [...])、("or", [...])、("not", node)
+_QUERY_TOKEN_RE = re.compile(r"[()]|[^\s()]+")
+_OPERATORS = {"AND", "OR", "NOT"}
+
+
+class _QueryParser:
+    def __init__(self, query, stopwords, default_operator):
+        self.tokens = _QUERY_TOKEN_RE.findall(query)
+        self.pos = 0
+        self.stopwords = stopwords
+        self.default_operator = default_operator
+        self.negated = 0  # 处于 NOT / 排除词内部时，词不参与打分
+        self.positive_words = []  # 参与BM25打分的词（按出现顺序，保留重复）
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        while self.peek() is not None:  # 多余的右括号等，跳过后继续
+            self.next()
+            rest = self.parse_or()
+            node = _combine("or", [node, rest])
+        return node
+
+    def parse_or(self):
+        clauses = [self.parse_and()]
+        while True:
+            token = self.peek()
+            if token == "OR":
+                self.next()
+            elif token is None or token == ")" or self.default_operator != "OR" or token == "AND":
+                break
+            clauses.append(self.parse_and())
+        return _build_clause("or", clauses)
+
+    def parse_and(self):
+        clauses = [self.parse_unary()]
+        while True:
+            token = self.peek()
+            if token == "AND":
+                self.next()
+            elif token is None or token in (")", "OR") or (self.default_operator != "AND" and token != "NOT"):
+                break
+            clauses.append(self.parse_unary())
+        if len(clauses) == 1:
+            return clauses[0]  # 单个子句原样返回，必含/排除标记交由上层处理
+        return _build_clause("and", clauses)
+
+    def parse_unary(self):
+        token = self.next()
+        if token is None or token == ")":
+            return None
+        if token == "NOT":
+            return ("must_not", self.parse_negated(self.parse_unary))
+        if token == "(":
+            node = self.parse_or()
+            if self.peek() == ")":
+                self.next()
+            return node
+        if token in _OPERATORS:
+            return None  # 连续的运算符，忽略
+        if len(token) > 1 and token[0] == "-":
+            return ("must_not", self.parse_negated(lambda: self.parse_term(token[1:])))
+        if len(token) > 1 and token[0] == "+":
+            return ("must", self.parse_term(token[1:]))
+        return self.parse_term(token)
+
+    def parse_negated(self, parse):
+        self.negated += 1
+        try:
+            node = parse()
+        finally:
+            self.negated -= 1
+        if node is not None and node[0] in ("must", "must_not"):
+            node = node[1]  # NOT -a、NOT +a 均按 NOT a 处理
+        return node
+
+    def parse_term(self, text):
+        words = tokenize(text, self.stopwords)
+        if not self.negated:
+            self.positive_words.extend(words)
+        op = "and" if self.default_operator == "AND" else "or"
+        return _combine(op, [("term", word) for word in words])
+
+
+def _combine(op, children):
+    children = [child for child in children if child is not None]
+    if not children:
+        return None
+    if len(children) == 1:
+        return children[0]
+    return (op, children)
+
+
+def _is_exclusion(node):
+    """只含排除子句的节点，如 ``(NOT a)`` 解析出的 ("and", [("not", a)])"""
+    return node is not None and node[0] == "and" and all(child[0] == "not" for child in node[1])
+
+
+def _build_clause(op, clauses):
+    """把同一层的子句组装成节点：must/must_not 总是与其余子句取交/差"""
+    should, must, must_not = [], [], []
+    for clause in clauses:
+        if clause is None:
+            continue
+        if clause[0] == "must":
+            must.append(clause[1])
+        elif clause[0] == "must_not":
+            must_not.append(clause[1])
+        else:
+            should.append(clause)
+    # 全为停用词的 +词 / -词 解析为 None，不应占据必含/排除的位置
+    must = [node for node in must if node is not None]
+    must_not = [node for node in must_not if node is not None]
+
+    if op == "and":
+        must.extend(should)
+    elif not must:
+        must.append(_combine("or", should))
+    # op == "or" 且存在必含词时，可选词只参与打分，不影响候选集
+
+    # 与其余子句取交的纯排除分组（如 a AND (NOT b)）并入本层的排除子句，
+    # 否则它单独求值为空集，使整个交集为空
+    for node in [node for node in must if _is_exclusion(node)]:
+        must.remove(node)
+        must_not.extend(child[1] for child in node[1])
+
+    if not must_not:
+        return _combine("and", must)
+    positive = _combine("and", must)
+    negative = [("not", node) for node in must_not]
+    return _combine("and", [positive] + negative) if positive is not None else ("and", negative)
+
+
+def parse_query(query, stopwords, default_operator="OR"):
+    """解析布尔查询，返回 (语法树, 参与打分的查询词)"""
+    default_operator = default_operator.upper()
+    if default_operator not in ("AND", "OR"):
+        raise ValueError(f"不支持的默认运算符：{default_operator}")
+    parser = _QueryParser(query, stopwords, default_operator)
+    return parser.parse(), parser.positive_words
+
+
+def _gallop(seq, target, lo):
+    """在 seq[lo:] 中以指数步长定位，再二分查找第一个 >= target 的位置"""
+    n = len(seq)
+    step = 1
+    hi = lo
+    while hi < n and seq[hi] < target:
+        lo = hi + 1
+        hi += step
+        step <<= 1
+    return bisect_left(seq, target, lo, min(hi, n))
+
+
+def intersect_postings(lists):
+    """多个升序文档ID表求交：从最短的表开始，在较长的表中跳跃查找"""
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    result = list(lists[0])
+    for other in lists[1:]:
+        if not result:
+            break
+        matched = []
+        pos = 0
+        for doc_id in result:
+            pos = _gallop(other, doc_id, pos)
+            if pos >= len(other):
+                break
+            if other[pos] == doc_id:
+                matched.append(doc_id)
+        result = matched
+    return result
+
+
+def subtract_postings(docs, excluded):
+    """升序文档ID表求差：docs 中去掉 excluded 里出现的文档"""
+    result = []
+    pos = 0
+    for doc_id in docs:
+        pos = _gallop(excluded, doc_id, pos)
+        if pos >= len(excluded) or excluded[pos] != doc_id:
+            result.append(doc_id)
+    return result
+
+
+def evaluate_query(node, sorted_postings):
+    """在升序文档ID表上求值语法树，返回满足条件的升序文档ID表"""
+    if node is None:
+        return []
+    kind = node[0]
+    if kind == "term":
+        return list(sorted_postings.get(node[1], ()))
+    if kind == "or":
+        merged = set()
+        for child in node[1]:
+            merged.update(evaluate_query(child, sorted_postings))
+        return sorted(merged)
+    # kind == "and"：先对正向子句求交，再逐个减去排除子句（纯排除的分组并入排除子句）
+    positive, negative = [], []
+    for child in node[1]:
+        if child[0] == "not":
+            negative.append(child[1])
+        elif _is_exclusion(child):
+            negative.extend(grandchild[1] for grandchild in child[1])
+        else:
+            positive.append(child)
+    if not positive:
+        return []  # 纯排除查询不返回结果
+    docs = intersect_postings([evaluate_query(child, sorted_postings) for child in positive])
+    for child in negative:
+        if not docs:
+            break
+        docs = subtract_postings(docs, evaluate_query(child, sorted_postings))
+    return docs
+
+
+def prioritize_candidates(candidate_docs, query_words, index_data, limit=None):
+    """按查询词从稀有到常见的顺序重排候选文档，可只保留前 ``limit`` 个
+
+    稀有词IDF高，含稀有词的文档最可能进入前列；截断候选集或提前终止打分时
+    优先保留这些文档。每个候选文档至少含一个正向查询词，因此不会遗漏。
+    """
+    allowed = set(candidate_docs)
+    limit = len(allowed) if limit is None else min(limit, len(allowed))
+    word_df = index_data["word_df"]
+    sorted_postings = index_data["sorted_postings"]
+
+    ordered = []
+    seen = set()
+    for word in sorted(set(query_words), key=lambda w: word_df.get(w, 0)):
+        for doc_id in sorted_postings.get(word, ()):
+            if doc_id in allowed and doc_id not in seen:
+                seen.add(doc_id)
+                ordered.append(doc_id)
+                if len(ordered) >= limit:
+                    return ordered
+    return ordered
+
+
 def retrieve(
     query: str,
     index_path: str | None = None,
     stopwords_path: str | None = None,
     top_n: int = 10,
+    default_operator: str = "OR",
+    stats: dict | None = None,
+    k1: float = DEFAULT_K1,
+    b: float = DEFAULT_B,
+    time_budget: float | None = None,
+    max_candidates: int | None = None,
+    parsed_query: tuple | None = None,
 ):
-    """检索函数：返回匹配的HTML编号（文档ID）及分数"""
-    index_path = index_path or DEFAULT_INDEX_PATH
-    stopwords = load_stopwords(stopwords_path)
+    """检索函数：返回匹配的HTML编号（文档ID）及分数
 
-    index_data = _INDEX_CACHE.get(index_path)
-    if not index_data:
-        try:
-            with open(index_path, "rb") as f:
-                index_data = pickle.load(f)
-        except FileNotFoundError as exc:
-            raise ValueError(f"索引文件不存在：{index_path}") from exc
-        _INDEX_CACHE[index_path] = index_data
+    支持 AND / OR / NOT、+必含词、-排除词与括号；相邻词之间使用
+    ``default_operator``（"OR" 或 "AND"）。先在升序文档ID表上求出候选集，
+    再仅对候选文档计算BM25分数。
+
+    传入 ``stats`` 字典时，会写入归一化后的查询词（``tokens``）、候选文档数
+    （``candidates``）、实际打分的文档数（``scored``）以及各阶段耗时
+    （``timings``，单位毫秒：load/parse/match/score）。
 
-    # 处理查询：分词、过滤停用词
-    query_words = tokenize(query, stopwords)
+    降级：候选文档超过 ``max_candidates`` 时只保留含最稀有查询词的文档；
+    ``time_budget``（秒，从调用开始计时）用尽时停止打分，返回已打分文档中的
+    最佳结果。两种情况下 ``stats["partial"]`` 为 True，表示结果可能不完整。
+
+    ``parsed_query`` 为调用方已得到的 ``parse_query(query, ...)`` 结果，传入时
+    不再重复分词。
+
+    线程安全：整个检索过程只读取调用开始时取得的同一份索引快照。
+    """
+    timings = {}
+    if stats is not None:
+        stats.update(tokens=[], candidates=0, scored=0, partial=False, timings=timings)
+    started = time.perf_counter()
+    deadline = None if time_budget is None else started + time_budget
+
+    def lap(stage):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = (now - started) * 1000
+        started = now
+
+    stopwords = load_stopwords(stopwords_path)
+    index_data = load_index(index_path)
+    lap("load")
+
+    # 处理查询：解析运算符、分词、过滤停用词
+    query_tree, query_words = parsed_query or parse_query(query, stopwords, default_operator)
+    lap("parse")
+    if stats is not None:
+        stats["tokens"] = query_words
     if not query_words:
         return []  # 无有效查询词
 
-    # 获取所有可能相关的文档（包含任一查询词的文档）
-    candidate_docs = set()
-    for word in query_words:
-        if word in index_data["inverted_index"]:
-            candidate_docs.update(index_data["inverted_index"][word].keys())
+    # 在升序文档ID表上求值，得到满足布尔条件的候选文档
+    candidate_docs = evaluate_query(query_tree, index_data["sorted_postings"])
+    lap("match")
+    if stats is not None:
+        stats["candidates"] = len(candidate_docs)
     if not candidate_docs:
         return []  # 无匹配文档
 
+    # 候选集过大时先打分最可能相关的文档，以便截断或超时后仍有较好的结果
+    partial = False
+    if max_candidates is not None and len(candidate_docs) > max_candidates:
+        candidate_docs = prioritize_candidates(candidate_docs, query_words, index_data, max_candidates)
+        partial = True
+    elif deadline is not None and len(candidate_docs) > DEADLINE_CHECK_INTERVAL:
+        candidate_docs = prioritize_candidates(candidate_docs, query_words, index_data)
+
     # 计算每个候选文档的BM25分数
     doc_scores = []
+    scored = 0
     for doc_id in candidate_docs:
-        score = bm25_score(query_words, doc_id, index_data)
+        if deadline is not None and scored and scored % DEADLINE_CHECK_INTERVAL == 0:
+            if time.perf_counter() > deadline:
+                partial = True  # 时间预算用尽，返回目前为止的最佳结果
+                break
+        scored += 1
+        score = bm25_score(query_words, doc_id, index_data, k1, b)
         if score > 0:
             doc_scores.append((doc_id, score))
 
     # 按分数降序排序，返回前N个
     doc_scores.sort(key=lambda x: x[1], reverse=True)
+    lap("score")
+    if stats is not None:
+        stats.update(scored=scored, partial=partial)
     return doc_scores[:top_n]
 
 
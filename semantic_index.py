@@ -0,0 +1,309 @@
+"""潜在语义索引（LSA）与 BM25 + 向量的混合检索。
+
+离线阶段从 ``bm25_index.pkl`` 的词-文档统计量构造 log(1+tf)·idf 加权矩阵，
+用纯 NumPy 的随机化截断 SVD 得到低维空间，保存为 ``.npz``：
+
+* ``term_vectors``：词向量 U_k（float32），用于把查询折叠（fold-in）进语义空间
+* ``doc_vectors``：单位化的文档向量 V_k·S_k（float32 矩阵）
+* 文档数较多时另存 IVF 倒排聚类（``ivf_centroids``/``ivf_offsets``/``ivf_members``）
+
+检索时对文档矩阵做暴力内积（或只扫描最近的 ``nprobe`` 个聚类），可以召回
+与查询没有字面重合、但在教材中共现的相关汉字。``hybrid_retrieve`` 把归一化
+的 BM25 分数与余弦相似度线性融合。
+
+用法::
+
+    python -m semantic_index build --dims 64
+    python -m semantic_index query 凶 --alpha 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from search_engine import (
+    BASE_DIR,
+    DEFAULT_INDEX_PATH,
+    bm25_idf,
+    evaluate_query,
+    load_cached_resource,
+    load_index,
+    load_stopwords,
+    parse_query,
+    retrieve,
+)
+
+
+DEFAULT_SEMANTIC_PATH = os.getenv("SEMANTIC_INDEX_PATH", str(BASE_DIR / "semantic_index.npz"))
+IVF_MIN_DOCS = 2000  # 文档数少于该值时暴力检索已足够快
+
+
+# ---------------------- 离线构建 ----------------------
+def _randomized_svd(rows, cols, values, shape, k, n_iter=4, seed=0):
+    """稀疏矩阵（COO 三元组）的随机化截断 SVD，仅依赖 NumPy"""
+    rng = np.random.default_rng(seed)
+    n_rows, n_cols = shape
+
+    def matmul(dense):  # X @ dense
+        out = np.zeros((n_rows, dense.shape[1]))
+        np.add.at(out, rows, values[:, None] * dense[cols])
+        return out
+
+    def rmatmul(dense):  # X.T @ dense
+        out = np.zeros((n_cols, dense.shape[1]))
+        np.add.at(out, cols, values[:, None] * dense[rows])
+        return out
+
+    oversample = min(k + 10, min(shape))
+    q, _ = np.linalg.qr(matmul(rng.standard_normal((n_cols, oversample))))
+    for _ in range(n_iter):  # 幂迭代提高精度
+        q, _ = np.linalg.qr(rmatmul(q))
+        q, _ = np.linalg.qr(matmul(q))
+    b = rmatmul(q).T  # (oversample × n_cols) = Q.T @ X
+    u_hat, s, vt = np.linalg.svd(b, full_matrices=False)
+    u = q @ u_hat
+    return u[:, :k], s[:k], vt[:k]
+
+
+def _kmeans(vectors, n_clusters, n_iter=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = np.argmax(vectors @ centroids.T, axis=1)  # 单位向量上的球面 k-means
+        for c in range(n_clusters):
+            members = vectors[assign == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def build_semantic_index(
+    index_path: str | None = None,
+    save_path: str | os.PathLike[str] = DEFAULT_SEMANTIC_PATH,
+    dims: int = 64,
+):
+    """由BM25索引的词-文档统计量训练LSA模型并保存"""
+    index_data = load_index(index_path)
+    terms = sorted(index_data["inverted_index"])
+    doc_ids = sorted(index_data["doc_lengths"])
+    term_pos = {term: i for i, term in enumerate(terms)}
+    doc_pos = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+    total_docs = index_data["total_docs"]
+
+    idf = np.array([bm25_idf(index_data["word_df"][t], total_docs) for t in terms])
+    rows, cols, values = [], [], []
+    for term, postings in index_data["inverted_index"].items():
+        for doc_id, tf in postings.items():
+            rows.append(term_pos[term])
+            cols.append(doc_pos[doc_id])
+            values.append(math.log1p(tf))
+    rows = np.array(rows)
+    values = np.array(values) * idf[rows]
+
+    dims = max(1, min(dims, len(terms) - 1, len(doc_ids) - 1))
+    u, s, vt = _randomized_svd(rows, np.array(cols), values, (len(terms), len(doc_ids)), dims)
+
+    doc_vectors = vt.T * s
+    doc_vectors /= np.linalg.norm(doc_vectors, axis=1, keepdims=True).clip(min=1e-12)
+    arrays = {
+        "terms": np.array(terms),
+        "idf": idf.astype(np.float32),
+        "doc_ids": np.array(doc_ids, dtype=np.int64),
+        "term_vectors": u.astype(np.float32),
+        "doc_vectors": doc_vectors.astype(np.float32),
+    }
+
+    if len(doc_ids) >= IVF_MIN_DOCS:
+        n_clusters = int(math.sqrt(len(doc_ids)))
+        centroids, assign = _kmeans(arrays["doc_vectors"], n_clusters)
+        order = np.argsort(assign, kind="stable")
+        arrays["ivf_centroids"] = centroids.astype(np.float32)
+        arrays["ivf_members"] = order.astype(np.int64)
+        arrays["ivf_offsets"] = np.searchsorted(assign[order], np.arange(n_clusters + 1)).astype(np.int64)
+
+    save_path = Path(save_path)
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(save_path, **arrays)
+    print(f"语义索引已保存至 {save_path}：{len(terms)} 个词，{len(doc_ids)} 个文档，{dims} 维")
+    return arrays
+
+
+# ---------------------- 在线检索 ----------------------
+class SemanticIndex:
+    """只读的LSA向量索引，可在多线程间共享"""
+
+    def __init__(self, path: str | os.PathLike[str]):
+        with np.load(path) as data:
+            self.term_pos = {str(term): i for i, term in enumerate(data["terms"])}
+            self.idf = data["idf"]
+            self.doc_ids = data["doc_ids"]
+            self.term_vectors = data["term_vectors"]
+            self.doc_vectors = data["doc_vectors"]
+            self.ivf_centroids = data["ivf_centroids"] if "ivf_centroids" in data else None
+            self.ivf_members = data["ivf_members"] if "ivf_members" in data else None
+            self.ivf_offsets = data["ivf_offsets"] if "ivf_offsets" in data else None
+        self.doc_pos = {int(doc_id): i for i, doc_id in enumerate(self.doc_ids)}
+
+    def memory_bytes(self) -> int:
+        """估算常驻内存（字节）：各数组加上词表与文档位置字典"""
+        arrays = (self.idf, self.doc_ids, self.term_vectors, self.doc_vectors,
+                  self.ivf_centroids, self.ivf_members, self.ivf_offsets)
+        total = sum(array.nbytes for array in arrays if array is not None)
+        total += sys.getsizeof(self.term_pos) + sum(sys.getsizeof(term) for term in self.term_pos)
+        return total + sys.getsizeof(self.doc_pos)
+
+    def query_vector(self, query_words):
+        positions = [self.term_pos[word] for word in query_words if word in self.term_pos]
+        if not positions:
+            return None
+        vector = (self.idf[positions, None] * self.term_vectors[positions]).sum(axis=0)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def similarities(self, query_vector, doc_ids):
+        """给定文档的余弦相似度"""
+        positions = [self.doc_pos[doc_id] for doc_id in doc_ids if doc_id in self.doc_pos]
+        return dict(zip((int(self.doc_ids[p]) for p in positions), self.doc_vectors[positions] @ query_vector))
+
+    def search(self, query_words, top_n=10, nprobe=4):
+        """返回余弦相似度最高的 [(doc_id, 相似度), ...]"""
+        query_vector = self.query_vector(query_words)
+        if query_vector is None:
+            return []
+
+        if self.ivf_centroids is not None:
+            probes = np.argsort(-(self.ivf_centroids @ query_vector))[:nprobe]
+            candidates = np.concatenate(
+                [self.ivf_members[self.ivf_offsets[c]:self.ivf_offsets[c + 1]] for c in probes]
+            )
+            scores = self.doc_vectors[candidates] @ query_vector
+        else:
+            candidates = np.arange(len(self.doc_ids))
+            scores = self.doc_vectors @ query_vector
+
+        top_n = min(top_n, len(scores))
+        if top_n <= 0:
+            return []
+        best = np.argpartition(-scores, top_n - 1)[:top_n]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self.doc_ids[candidates[i]]), float(scores[i])) for i in best if scores[i] > 0]
+
+
+def _read_semantic_index(path: str) -> SemanticIndex:
+    if not Path(path).exists():
+        raise ValueError(f"语义索引不存在：{path}")
+    return SemanticIndex(path)
+
+
+def load_semantic_index(path: str | None = None) -> SemanticIndex:
+    """加载语义索引（线程安全、计入索引内存预算）；文件缺失时抛出 ValueError"""
+    return load_cached_resource("semantic", path or DEFAULT_SEMANTIC_PATH, _read_semantic_index)
+
+
+def _is_disjunctive(node, positive_words) -> bool:
+    """语法树是否只是全部查询词的析取（不含 AND / NOT / +必含）
+
+    ``+必含 可选`` 的语法树只保留必含词，可选词仅参与打分，因此还要核对
+    语法树中的词覆盖了全部打分词。
+    """
+    if node is None:
+        return True
+    if node[0] == "term":
+        terms = [node]
+    elif node[0] == "or" and all(child[0] == "term" for child in node[1]):
+        terms = node[1]
+    else:
+        return False
+    return {term[1] for term in terms} >= set(positive_words)
+
+
+def hybrid_retrieve(
+    query: str,
+    index_path: str | None = None,
+    semantic_path: str | None = None,
+    stopwords_path: str | None = None,
+    top_n: int = 10,
+    alpha: float = 0.5,
+    candidates: int = 50,
+    default_operator: str = "OR",
+    stats: dict | None = None,
+    time_budget: float | None = None,
+    max_candidates: int | None = None,
+):
+    """BM25 与 LSA 的混合检索：``alpha·BM25/max(BM25) + (1-alpha)·余弦``
+
+    两路各取前 ``candidates`` 个结果求并集，只出现在一路中的文档另一路按 0
+    （或补算的余弦）计分。只有纯析取查询才允许向量一路召回无字面重合的文档；
+    含 AND / NOT / +必含 的查询，向量候选须先满足布尔语法树。
+    返回格式与 ``search_engine.retrieve`` 相同；
+    ``time_budget``/``max_candidates`` 只作用于 BM25 一路（向量检索本身耗时固定）。
+    """
+    stats = {} if stats is None else stats
+    query_tree, parsed_words = parse_query(query, load_stopwords(stopwords_path), default_operator)
+    lexical = retrieve(
+        query,
+        index_path=index_path,
+        stopwords_path=stopwords_path,
+        top_n=candidates,
+        default_operator=default_operator,
+        stats=stats,
+        time_budget=time_budget,
+        max_candidates=max_candidates,
+        parsed_query=(query_tree, parsed_words),
+    )
+    query_words = stats.get("tokens") or parsed_words
+
+    semantic_index = load_semantic_index(semantic_path)
+    query_vector = semantic_index.query_vector(query_words)
+    if query_vector is None:
+        return lexical[:top_n]
+
+    cosine = dict(semantic_index.search(query_words, top_n=candidates))
+    if not _is_disjunctive(query_tree, parsed_words):
+        allowed = set(evaluate_query(query_tree, load_index(index_path)["sorted_postings"]))
+        cosine = {doc_id: score for doc_id, score in cosine.items() if doc_id in allowed}
+    missing = [doc_id for doc_id, _ in lexical if doc_id not in cosine]
+    cosine.update(semantic_index.similarities(query_vector, missing))
+
+    max_bm25 = lexical[0][1] if lexical else 1.0
+    lexical_scores = dict(lexical)
+    fused = [
+        (doc_id, alpha * lexical_scores.get(doc_id, 0.0) / max_bm25 + (1 - alpha) * max(float(cosine.get(doc_id, 0.0)), 0.0))
+        for doc_id in set(lexical_scores) | set(cosine)
+    ]
+    fused = [item for item in fused if item[1] > 0]
+    fused.sort(key=lambda x: x[1], reverse=True)
+    return fused[:top_n]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="潜在语义索引的构建与混合检索")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="由BM25索引训练LSA模型")
+    build.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    build.add_argument("--out", default=DEFAULT_SEMANTIC_PATH)
+    build.add_argument("--dims", type=int, default=64)
+
+    query = sub.add_parser("query", help="混合检索")
+    query.add_argument("query")
+    query.add_argument("--alpha", type=float, default=0.5, help="BM25 权重，0 为纯向量检索")
+    query.add_argument("--top", type=int, default=10)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build_semantic_index(args.index, args.out, args.dims)
+    else:
+        for i, (doc_id, score) in enumerate(hybrid_retrieve(args.query, top_n=args.top, alpha=args.alpha), 1):
+            print(f"{i}. HTML编号：{doc_id}，混合分数：{score:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""分片索引的检索协调器：并行查询各分片，按全局统计量打分并合并 top-k。
+
+分片由 ``search_engine.build_sharded_index`` 生成。协调器只持有全局
+``word_df``/``total_docs``/``avg_doc_length``，查询时先在本地算好 IDF，再把
+``(布尔语法树, 查询词, IDF)`` 分发给各分片；每个分片持有自己文档的完整倒排表，
+可以独立求值 AND / OR / NOT，因此候选集与打分结果都与单体索引完全一致。
+
+分片可以在本机进程中执行（每个分片固定由一个进程加载并检索，各进程只常驻
+自己的分片），也可以通过 ``serve`` 子命令启动的 HTTP 服务模拟远程节点::
+
+    python -m sharded_index build --shards 4
+    python -m sharded_index serve bm25_shards/shard-0.pkl --port 8101
+    python -m sharded_index query 春 --remote http://127.0.0.1:8101 ...
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import os
+import pickle
+import threading
+import urllib.request
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from search_engine import (
+    DEFAULT_B,
+    DEFAULT_K1,
+    DEFAULT_SHARDS_DIR,
+    bm25_idf,
+    bm25_tf_part,
+    build_sharded_index,
+    evaluate_query,
+    load_stopwords,
+    parse_query,
+)
+
+
+_SHARD_CACHE: dict[str, dict] = {}
+
+
+# ---------------------- 分片侧：加载与打分 ----------------------
+def load_shard(shard_path: str) -> dict:
+    """加载单个分片（每个进程缓存一份）"""
+    shard = _SHARD_CACHE.get(shard_path)
+    if shard is None:
+        try:
+            with open(shard_path, "rb") as f:
+                shard = pickle.load(f)
+        except FileNotFoundError as exc:
+            raise ValueError(f"分片文件不存在：{shard_path}") from exc
+        # 布尔求值用的升序文档ID表，与 search_engine 的索引快照相同
+        shard["sorted_postings"] = {
+            word: tuple(sorted(postings)) for word, postings in shard["inverted_index"].items()
+        }
+        _SHARD_CACHE[shard_path] = shard
+    return shard
+
+
+def score_shard(shard, query_words, idf, avg_len, top_n, k1=DEFAULT_K1, b=DEFAULT_B, query_tree=None):
+    """用全局IDF为分片内的候选文档打分，返回 (该分片的前N个结果, 候选文档数)
+
+    ``query_tree`` 为 ``search_engine.parse_query`` 的语法树（经 JSON 传输时元组
+    变为列表，不影响求值），候选文档须满足该布尔条件；与 ``evaluate_query``
+    相同，为 None 时没有匹配文档。
+    """
+    inverted_index = shard["inverted_index"]
+    doc_lengths = shard["doc_lengths"]
+    candidate_docs = evaluate_query(query_tree, shard["sorted_postings"])
+
+    doc_scores = []
+    for doc_id in candidate_docs:
+        doc_len = doc_lengths.get(doc_id, 0)
+        if doc_len == 0:
+            continue
+        # 与 search_engine.bm25_score 的累加顺序保持一致，保证分数逐位相同
+        score = 0.0
+        for word in query_words:
+            if word not in idf:
+                continue
+            tf = inverted_index.get(word, {}).get(doc_id, 0)
+            score += idf[word] * bm25_tf_part(tf, doc_len, avg_len, k1, b)
+        if score > 0:
+            doc_scores.append((doc_id, score))
+    return heapq.nlargest(top_n, doc_scores, key=lambda x: x[1]), len(candidate_docs)
+
+
+def _search_local_shard(shard_path, query_tree, query_words, idf, avg_len, top_n):
+    return score_shard(load_shard(shard_path), query_words, idf, avg_len, top_n, query_tree=query_tree)
+
+
+def _resident_shards():
+    return sorted(_SHARD_CACHE)
+
+
+def _search_remote_shard(url, query_tree, query_words, idf, avg_len, top_n, timeout):
+    payload = json.dumps(
+        {"query_tree": query_tree, "query_words": query_words, "idf": idf, "avg_doc_length": avg_len, "top_n": top_n},
+        ensure_ascii=False,
+    ).encode("utf-8")
+    request = urllib.request.Request(
+        url.rstrip("/") + "/search",
+        data=payload,
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as resp:
+        body = json.loads(resp.read().decode("utf-8"))
+    return [(int(doc_id), score) for doc_id, score in body["results"]], body["candidates"]
+
+
+def serve_shard(shard_path: str, host: str = "127.0.0.1", port: int = 8101) -> None:
+    """以HTTP服务的形式托管单个分片，作为远程节点的本地替身"""
+    shard = load_shard(str(shard_path))
+
+    class ShardHandler(BaseHTTPRequestHandler):
+        def do_POST(self):  # noqa: N802
+            if self.path != "/search":
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            req = json.loads(self.rfile.read(length).decode("utf-8"))
+            results, candidates = score_shard(
+                shard, req["query_words"], req["idf"], req["avg_doc_length"], req["top_n"],
+                query_tree=req.get("query_tree"),
+            )
+            body = json.dumps({"results": results, "candidates": candidates}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # noqa: A002
+            pass
+
+    server = ThreadingHTTPServer((host, port), ShardHandler)
+    print(f"分片 {shard_path} 已在 http://{host}:{port} 提供服务")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+# ---------------------- 协调器：分发与合并 ----------------------
+class ShardedRetriever:
+    """并行查询所有分片并合并前N个结果。
+
+    未指定 ``shard_urls`` 时在本机检索 ``shards_dir`` 下的分片：每个分片对应一个
+    单进程执行器，进程启动时加载该分片，因此每个分片只在一个进程中常驻。
+    指定后改为并发请求各远程分片服务（顺序对应分片编号），``max_workers``
+    为请求线程数。
+
+    ``close()`` 之后仍被调用时（例如已被缓存淘汰、但仍有请求持有引用），
+    按需重新启动执行器。
+    """
+
+    def __init__(
+        self,
+        shards_dir: str | os.PathLike[str] = DEFAULT_SHARDS_DIR,
+        stopwords_path: str | None = None,
+        shard_urls: list[str] | None = None,
+        max_workers: int | None = None,
+        timeout: float = 5.0,
+    ):
+        shards_dir = Path(shards_dir)
+        try:
+            with open(shards_dir / "global.pkl", "rb") as f:
+                self.global_stats = pickle.load(f)
+        except FileNotFoundError as exc:
+            raise ValueError(f"分片索引不存在：{shards_dir}") from exc
+
+        self.stopwords = load_stopwords(stopwords_path)
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        num_shards = self.global_stats["num_shards"]
+        self.shard_urls = list(shard_urls or [])
+        self.shard_paths = [str(shards_dir / f"shard-{i}.pkl") for i in range(num_shards)]
+
+        if not self.shard_urls:
+            missing = [path for path in self.shard_paths if not Path(path).exists()]
+            if missing:
+                raise ValueError(f"分片文件不存在：{', '.join(missing)}")
+        self._executors: list[Executor] = self._start_executors()
+
+    def _start_executors(self) -> list[Executor]:
+        if self.shard_urls:
+            return [self._start_executor(0)]
+        # 进程池没有任务亲和性：共用一个池时每个 worker 最终都会加载全部分片
+        return [self._start_executor(i) for i in range(len(self.shard_paths))]
+
+    def _start_executor(self, i) -> Executor:
+        if self.shard_urls:
+            return ThreadPoolExecutor(max_workers=self.max_workers or len(self.shard_urls))
+        return ProcessPoolExecutor(max_workers=1, initializer=load_shard, initargs=(self.shard_paths[i],))
+
+    def _submit(self, i, fn, *args):
+        with self._lock:
+            try:
+                return self._executors[i].submit(fn, *args)
+            except RuntimeError:  # 执行器已关闭，或分片进程崩溃（BrokenProcessPool）
+                self._executors[i].shutdown(wait=False)
+                self._executors[i] = self._start_executor(i)  # 只重启这一个，其余分片进程照常工作
+                return self._executors[i].submit(fn, *args)
+
+    def retrieve(
+        self,
+        query: str,
+        top_n: int = 10,
+        default_operator: str = "OR",
+        stats: dict | None = None,
+        time_budget: float | None = None,
+    ):
+        """与 ``search_engine.retrieve`` 返回格式相同：[(doc_id, score), ...]
+
+        查询语法与 ``search_engine.retrieve`` 一致（AND / OR / NOT、+必含词、
+        -排除词与括号），语法树在协调器解析后分发给各分片求值。
+
+        指定 ``time_budget``（秒）时只合并在预算内返回的分片，其余分片的结果
+        被丢弃并在 ``stats["partial"]`` 中标记为不完整。``stats["candidates"]``
+        为已返回分片的候选文档数之和。
+        """
+        if stats is not None:
+            stats.update(tokens=[], candidates=0, partial=False, timings={})
+        query_tree, query_words = parse_query(query, self.stopwords, default_operator)
+        if stats is not None:
+            stats["tokens"] = query_words
+        if not query_words or query_tree is None:
+            return []
+
+        word_df = self.global_stats["word_df"]
+        total_docs = self.global_stats["total_docs"]
+        idf = {word: bm25_idf(word_df[word], total_docs) for word in set(query_words) if word in word_df}
+        if not idf:
+            return []
+        avg_len = self.global_stats["avg_doc_length"]
+
+        if self.shard_urls:
+            futures = [
+                self._submit(0, _search_remote_shard, url, query_tree, query_words, idf, avg_len, top_n, self.timeout)
+                for url in self.shard_urls
+            ]
+        else:
+            futures = [
+                self._submit(i, _search_local_shard, path, query_tree, query_words, idf, avg_len, top_n)
+                for i, path in enumerate(self.shard_paths)
+            ]
+
+        done, pending = wait(futures, timeout=time_budget)
+        for future in pending:
+            future.cancel()
+        if stats is not None:
+            stats["partial"] = bool(pending)
+
+        merged = []
+        candidates = 0
+        for future in futures:
+            if future not in done:
+                continue
+            try:
+                results, shard_candidates = future.result()
+            except (OSError, BrokenExecutor) as exc:
+                raise ValueError(f"分片检索失败：{exc}") from exc
+            merged.extend(results)
+            candidates += shard_candidates
+        if stats is not None:
+            stats["candidates"] = candidates
+        return heapq.nlargest(top_n, merged, key=lambda x: x[1])
+
+    def worker_shards(self) -> list[list[str]]:
+        """各本地分片进程中常驻的分片文件，按分片编号排列；远程分片时为空"""
+        if self.shard_urls:
+            return []
+        return [executor.submit(_resident_shards).result() for executor in self._executors]
+
+    def close(self, wait: bool = True) -> None:
+        """关闭执行器；``wait=False`` 时不等待进行中的检索与进程退出"""
+        with self._lock:
+            executors = list(self._executors)
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="分片索引的构建、分片服务与检索")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="构建分片索引")
+    build.add_argument("--shards", type=int, default=4)
+    build.add_argument("--out", default=DEFAULT_SHARDS_DIR)
+
+    serve = sub.add_parser("serve", help="以HTTP服务托管单个分片")
+    serve.add_argument("shard_path")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8101)
+
+    query = sub.add_parser("query", help="检索分片索引")
+    query.add_argument("query")
+    query.add_argument("--shards-dir", default=DEFAULT_SHARDS_DIR)
+    query.add_argument("--remote", nargs="*", default=None, help="远程分片地址，按分片编号排列")
+    query.add_argument("--top", type=int, default=10)
+    query.add_argument("--operator", default="OR", choices=["OR", "AND"], help="相邻查询词之间的默认运算符")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build_sharded_index(num_shards=args.shards, save_dir=args.out)
+    elif args.command == "serve":
+        serve_shard(args.shard_path, host=args.host, port=args.port)
+    else:
+        with ShardedRetriever(args.shards_dir, shard_urls=args.remote) as retriever:
+            results = retriever.retrieve(args.query, top_n=args.top, default_operator=args.operator)
+            for i, (doc_id, score) in enumerate(results, 1):
+                print(f"{i}. HTML编号：{doc_id}，BM25分数：{score:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+/*
+ * 浏览器端 BM25 检索：读取 static_export 导出的 search-index/ 分片索引。
+ * 打分公式与 search_engine.bm25_score 一致；分词为词表正向最大匹配，
+ * 是 jieba 精确模式的近似。
+ */
+(function () {
+    "use strict";
+
+    var INDEX_ROOT = "/search-index/";
+
+    // 需与 static_export.shard_of 保持一致
+    function shardOf(term, shardCount) {
+        var h = 0;
+        for (var ch of term) {
+            h = (Math.imul(h, 31) + ch.codePointAt(0)) >>> 0;
+        }
+        return h % shardCount;
+    }
+
+    function fetchJson(url) {
+        return fetch(url).then(function (resp) {
+            if (!resp.ok) {
+                throw new Error("HTTP " + resp.status + "：" + url);
+            }
+            return resp.json();
+        });
+    }
+
+    function Bm25Index(meta) {
+        this.meta = meta;
+        this.vocab = new Set(meta.vocab ? meta.vocab.split("\n") : []);
+        this.shards = {};
+    }
+
+    Bm25Index.load = function () {
+        return fetchJson(INDEX_ROOT + "meta.json").then(function (meta) {
+            return new Bm25Index(meta);
+        });
+    };
+
+    Bm25Index.prototype.tokenize = function (text) {
+        var chars = Array.from(text || "");
+        var maxLen = this.meta.max_term_length;
+        var words = [];
+        var i = 0;
+        while (i < chars.length) {
+            var matched = 0;
+            for (var len = Math.min(maxLen, chars.length - i); len > 0; len--) {
+                if (this.vocab.has(chars.slice(i, i + len).join(""))) {
+                    matched = len;
+                    break;
+                }
+            }
+            if (matched) {
+                words.push(chars.slice(i, i + matched).join(""));
+                i += matched;
+            } else {
+                i += 1;  // 词表外字符（含停用词、标点）直接跳过
+            }
+        }
+        return words;
+    };
+
+    Bm25Index.prototype.loadShard = function (n) {
+        if (!this.shards[n]) {
+            var name = "shard-" + (n < 10 ? "0" : "") + n + ".json";
+            this.shards[n] = fetchJson(INDEX_ROOT + name);
+        }
+        return this.shards[n];
+    };
+
+    Bm25Index.prototype.postings = function (words) {
+        var self = this;
+        var unique = Array.from(new Set(words));
+        return Promise.all(unique.map(function (w) {
+            return self.loadShard(shardOf(w, self.meta.shard_count)).then(function (shard) {
+                return [w, shard[w]];
+            });
+        })).then(function (pairs) {
+            var map = {};
+            pairs.forEach(function (p) {
+                if (p[1]) {
+                    map[p[0]] = p[1];
+                }
+            });
+            return map;
+        });
+    };
+
+    Bm25Index.prototype.search = function (query, topN) {
+        var meta = this.meta;
+        var words = this.tokenize(query);
+        if (!words.length) {
+            return Promise.resolve([]);
+        }
+        return this.postings(words).then(function (postings) {
+            var k1 = meta.k1, b = meta.b;
+            var n = meta.total_docs, avgLen = meta.avg_doc_length;
+            var scores = new Map();
+            // 与 Python 端相同：重复的查询词重复计分
+            words.forEach(function (w) {
+                var encoded = postings[w];
+                if (!encoded) {
+                    return;
+                }
+                var df = encoded[0];
+                var idf = Math.log((n - df + 0.5) / (df + 0.5) + 1);
+                var pos = 0;
+                for (var i = 1; i < encoded.length; i += 2) {
+                    pos += encoded[i];
+                    var tf = encoded[i + 1];
+                    var docLen = meta.doc_lengths[pos];
+                    if (!docLen) {
+                        continue;
+                    }
+                    var tfPart = (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * docLen / avgLen));
+                    scores.set(pos, (scores.get(pos) || 0) + idf * tfPart);
+                }
+            });
+            var results = [];
+            scores.forEach(function (score, pos) {
+                if (score > 0) {
+                    results.push({docId: meta.doc_ids[pos], title: meta.titles[pos], score: score});
+                }
+            });
+            results.sort(function (a, b) { return b.score - a.score; });
+            return results.slice(0, topN || 10);
+        });
+    };
+
+    window.Bm25Index = Bm25Index;
+})();
@@ -0,0 +1,155 @@
+"""静态站点导出：把详情页、检索页与客户端检索索引渲染到一个目录。
+
+导出结果可直接部署到任意静态托管或 CDN，浏览器端由 ``static/js/bm25.js``
+完成分词与 BM25 打分；Flask 应用仍可作为动态回退（``--fallback-url``）。
+
+用法::
+
+    python -m static_export dist --shards 8 --fallback-url https://example.onrender.com
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Any
+
+from flask import render_template
+
+from html_extract import extract_document
+from online_textbook import create_app
+from search_engine import DEFAULT_B, DEFAULT_K1
+
+
+INDEX_FORMAT_VERSION = 1
+DEFAULT_SHARD_COUNT = 8
+
+
+# ---------------------- 客户端索引 ----------------------
+def shard_of(term: str, shard_count: int) -> int:
+    """词项所属分片；需与 ``static/js/bm25.js`` 中的 ``shardOf`` 保持一致。"""
+    h = 0
+    for ch in term:
+        h = (h * 31 + ord(ch)) & 0xFFFFFFFF
+    return h % shard_count
+
+
+def build_client_index(
+    index_data: dict,
+    titles: dict[int, str] | None = None,
+    shard_count: int = DEFAULT_SHARD_COUNT,
+    k1: float = DEFAULT_K1,
+    b: float = DEFAULT_B,
+) -> tuple[dict, list[dict]]:
+    """把 ``bm25_index.pkl`` 的倒排表压缩成 (meta, shards)。
+
+    文档以序号引用，倒排表存为 ``[df, 序号差值1, tf1, 序号差值2, tf2, ...]``
+    的扁平数组，JSON 体积约为直接序列化字典的三分之一。
+    """
+    titles = titles or {}
+    doc_ids = sorted(index_data["doc_lengths"])
+    ordinal = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+
+    shards: list[dict] = [{} for _ in range(shard_count)]
+    for word, postings in index_data["inverted_index"].items():
+        encoded = [index_data["word_df"][word]]
+        prev = 0
+        for pos, tf in sorted((ordinal[doc_id], tf) for doc_id, tf in postings.items()):
+            encoded.extend((pos - prev, tf))
+            prev = pos
+        shards[shard_of(word, shard_count)][word] = encoded
+
+    vocab = sorted(index_data["inverted_index"])
+    meta = {
+        "version": INDEX_FORMAT_VERSION,
+        "k1": k1,
+        "b": b,
+        "shard_count": shard_count,
+        "total_docs": index_data["total_docs"],
+        "avg_doc_length": index_data["avg_doc_length"],
+        "doc_ids": doc_ids,
+        "doc_lengths": [index_data["doc_lengths"][doc_id] for doc_id in doc_ids],
+        "titles": [titles.get(doc_id, f"文档{doc_id}") for doc_id in doc_ids],
+        # 浏览器端没有 jieba，按词表做正向最大匹配分词
+        "max_term_length": max((len(w) for w in vocab), default=1),
+        "vocab": "\n".join(vocab),
+    }
+    return meta, shards
+
+
+def _write_json(path: Path, data: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+# ---------------------- 页面渲染 ----------------------
+def _doc_ids_in(htmls_dir: Path) -> list[int]:
+    return sorted(int(p.stem) for p in htmls_dir.glob("*.html") if p.stem.isdigit())
+
+
+def export_static_site(
+    out_dir: str | os.PathLike[str],
+    config: dict[str, Any] | None = None,
+    shard_count: int = DEFAULT_SHARD_COUNT,
+    fallback_url: str | None = None,
+) -> dict:
+    """渲染全部 ``/doc/<doc_id>`` 页面、检索页与分片索引到 ``out_dir``。
+
+    详情页通过应用自身的测试客户端渲染，与线上页面（含“相关汉字”）完全一致。
+    返回导出摘要。
+    """
+    # 导出时的页面请求不是真实访问，不写入查询日志
+    app = create_app({"QUERY_LOG_PATH": "", **(config or {})})
+    out_dir = Path(out_dir)
+    htmls_dir = Path(app.config["HTMLS_DIR"])
+
+    with open(app.config["INDEX_PATH"], "rb") as f:
+        index_data = pickle.load(f)
+
+    titles: dict[int, str] = {}
+    client = app.test_client()
+    for doc_id in _doc_ids_in(htmls_dir):
+        response = client.get(f"/doc/{doc_id}")
+        if response.status_code != 200:
+            print(f"跳过无法渲染的文档：{doc_id}（HTTP {response.status_code}）")
+            continue
+        # /doc/<id>/index.html 可被所有静态托管按 /doc/<id>/ 访问
+        page_path = out_dir / "doc" / str(doc_id) / "index.html"
+        page_path.parent.mkdir(parents=True, exist_ok=True)
+        page_path.write_bytes(response.get_data())
+        title = extract_document(htmls_dir / f"{doc_id}.html").title
+        titles[doc_id] = title if title is not None else f"文档{doc_id}"
+
+    meta, shards = build_client_index(index_data, titles=titles, shard_count=shard_count)
+    for i, shard in enumerate(shards):
+        _write_json(out_dir / "search-index" / f"shard-{i:02d}.json", shard)
+    _write_json(out_dir / "search-index" / "meta.json", meta)
+
+    with app.test_request_context():
+        search_page = render_template("static_search.html", fallback_url=(fallback_url or "").rstrip("/"))
+    (out_dir / "index.html").write_text(search_page, encoding="utf-8")
+
+    if app.static_folder and Path(app.static_folder).exists():
+        shutil.copytree(app.static_folder, out_dir / "static", dirs_exist_ok=True)
+
+    summary = {"documents": len(titles), "terms": len(index_data["inverted_index"]), "shards": shard_count}
+    print(f"静态站点已导出至 {out_dir}：{summary['documents']} 个文档，{summary['terms']} 个词项，{shard_count} 个分片")
+    return summary
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="导出可静态托管的在线教材站点")
+    parser.add_argument("out_dir", help="导出目录")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARD_COUNT, help="检索索引分片数")
+    parser.add_argument("--fallback-url", default=None, help="索引加载失败时回退的 Flask 应用地址")
+    args = parser.parse_args(argv)
+    export_static_site(args.out_dir, shard_count=args.shards, fallback_url=args.fallback_url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 模块位于仓库根目录（无安装包），直接运行 pytest 时也能导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,107 @@
+import logging
+import time
+
+import pytest
+
+import online_textbook
+import query_suggest
+import search_engine
+from online_textbook import create_app
+from search_engine import BASE_DIR
+from semantic_index import build_semantic_index
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    def make(**config):
+        return create_app({
+            "QUERY_LOG_PATH": "",
+            "WARMUP_PATH": "",
+            "STARTUP_PRELOAD": False,
+            "SUGGEST_INDEX_PATH": str(tmp_path / "missing-suggest.pkl"),
+            **config,
+        })
+    return make
+
+
+def test_empty_warmup_path_disables_warm_up(make_app, caplog):
+    with caplog.at_level(logging.WARNING):
+        make_app(WARMUP_PATH="")
+    assert "预热" not in caplog.text
+
+
+@pytest.mark.parametrize("mode", ["bm25", "hybrid"])
+def test_query_is_parsed_once(make_app, monkeypatch, tmp_path, mode):
+    semantic_path = str(tmp_path / "semantic_index.npz")
+    build_semantic_index(str(BASE_DIR / "bm25_index.pkl"), semantic_path, 16)
+    app = make_app(SEARCH_MODE=mode, SEMANTIC_INDEX_PATH=semantic_path)
+    client = app.test_client()
+
+    parses = []
+    original = search_engine._QueryParser.parse
+    monkeypatch.setattr(search_engine._QueryParser, "parse", lambda self: parses.append(1) or original(self))
+
+    assert client.post("/search", data={"query": "春天 -小草"}).status_code == 200
+    assert len(parses) == 1
+    assert client.post("/search", data={"query": " 春天  -小草 "}).status_code == 200
+    assert len(parses) == 1  # 只在空白上不同的查询命中结果缓存
+
+
+def test_long_query_is_truncated(make_app):
+    client = make_app(MAX_QUERY_CHARS=4).test_client()
+    page = client.post("/search", data={"query": "春天小草" + "的" * 200}).get_data(as_text=True)
+    assert "仅使用了前 4 个字" in page
+    page = client.post("/search", data={"query": "春天小草"}).get_data(as_text=True)
+    assert "仅使用了前" not in page
+
+
+def test_candidate_cap_marks_results_partial(make_app):
+    client = make_app(MAX_CANDIDATES=1).test_client()
+    assert "可能不完整" in client.post("/search", data={"query": "春天 小草"}).get_data(as_text=True)
+
+
+def test_busy_search_slots_answer_503(make_app):
+    app = make_app(MAX_CONCURRENT_SEARCHES=1, SEARCH_QUEUE_TIMEOUT_MS=10)
+    client = app.test_client()
+    slots = app.extensions["search_slots"]
+    assert slots.acquire(timeout=1)  # 模拟另一个正在进行的检索
+    try:
+        response = client.post("/search", data={"query": "春天"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert "请稍后再试" in response.get_data(as_text=True)
+    finally:
+        slots.release()
+    assert client.post("/search", data={"query": "春天"}).status_code == 200
+
+
+def test_rewrite_and_suggest_share_the_request_deadline(make_app, monkeypatch, tmp_path):
+    suggest_path = str(tmp_path / "suggest_index.pkl")
+    pinyin_path = str(tmp_path / "pinyin_readings.pkl")
+    query_suggest.build_suggest_index(str(BASE_DIR / "bm25_index.pkl"), BASE_DIR / "htmls", suggest_path, pinyin_path)
+    monkeypatch.setattr(query_suggest, "DEFAULT_PINYIN_PATH", pinyin_path)
+    app = make_app(SUGGEST_INDEX_PATH=suggest_path, SEARCH_TIME_BUDGET_MS=1000, SUGGEST_TIME_BUDGET_MS=5000)
+    client = app.test_client()
+    client.post("/search", data={"query": "春天"})  # 先加载分词器与索引
+
+    budgets = []
+    search, suggest = online_textbook._search, query_suggest.SuggestIndex.suggest
+
+    def slow_search(query, **kwargs):
+        budgets.append(("search", kwargs["time_budget"]))
+        time.sleep(0.2)
+        return search(query, **kwargs)
+
+    def record_suggest(self, query, query_words, time_budget=None):
+        budgets.append(("suggest", time_budget))
+        return suggest(self, query, query_words, time_budget=time_budget)
+
+    monkeypatch.setattr(online_textbook, "_search", slow_search)
+    monkeypatch.setattr(query_suggest.SuggestIndex, "suggest", record_suggest)
+    page = client.post("/search", data={"query": "chuntian"}).get_data(as_text=True)
+
+    assert "春天" in page
+    assert [stage for stage, _ in budgets] == ["search", "suggest", "search"]
+    assert budgets[0][1] <= 1.0
+    # 纠错与改写后的检索只能用首次检索剩下的时间，不会重新获得完整预算
+    assert budgets[2][1] <= budgets[1][1] <= 0.8
@@ -0,0 +1,132 @@
+import random
+
+import pytest
+
+from search_engine import evaluate_query, intersect_postings, parse_query, subtract_postings
+
+
+STOPWORDS = frozenset({"的"})
+POSTINGS = {
+    "春天": (1, 2, 3, 5, 8),
+    "小草": (2, 3, 13),
+    "山": (3, 5, 21),
+    "水": (5, 8, 13, 21),
+}
+SPRING = [1, 2, 3, 5, 8]
+
+
+@pytest.mark.parametrize(
+    "query, default_operator, expected",
+    [
+        ("春天", "OR", SPRING),
+        ("春天 小草", "OR", [1, 2, 3, 5, 8, 13]),
+        ("春天 小草", "AND", [2, 3]),
+        # 优先级：AND 高于 OR，括号改变结合
+        ("小草 OR 春天 AND 水", "OR", [2, 3, 5, 8, 13]),
+        ("(小草 OR 春天) AND 水", "OR", [5, 8, 13]),
+        ("小草 春天 OR 水", "AND", [2, 3, 5, 8, 13, 21]),
+        # +必含 / -排除
+        ("+春天 小草", "OR", SPRING),
+        ("+春天 +小草", "OR", [2, 3]),
+        ("春天 -小草", "OR", [1, 5, 8]),
+        ("春天 -小草", "AND", [1, 5, 8]),
+        ("春天 NOT 小草", "OR", [1, 5, 8]),
+        ("春天 AND NOT 小草", "OR", [1, 5, 8]),
+        # 只含排除子句的分组与外层取交
+        ("春天 AND (NOT 小草)", "OR", [1, 5, 8]),
+        ("春天 (NOT 小草)", "AND", [1, 5, 8]),
+        ("春天 AND (-小草 -山)", "OR", [1, 8]),
+        ("春天 OR (NOT 小草)", "OR", SPRING),
+        # 运算符内的停用词
+        ("春天 +的", "OR", SPRING),
+        ("春天 +的", "AND", SPRING),
+        ("春天 -的", "OR", SPRING),
+        ("春天 AND 的", "OR", SPRING),
+        ("的 OR 小草", "OR", [2, 3, 13]),
+        ("NOT 的", "OR", []),
+        # 纯排除与嵌套 NOT
+        ("NOT 春天", "OR", []),
+        ("-春天", "OR", []),
+        ("(NOT 小草)", "OR", []),
+        ("春天 NOT (小草 -山)", "OR", [1, 3, 5, 8]),
+        ("春天 NOT (小草 AND NOT 山)", "AND", [1, 3, 5, 8]),
+        ("春天 NOT (小草 OR 山)", "OR", [1, 8]),
+        ("NOT -小草 春天", "OR", [1, 5, 8]),
+        # 不配对的括号与多余的运算符
+        ("(春天 AND 小草", "OR", [2, 3]),
+        ("春天 AND 小草)", "OR", [2, 3]),
+        ("春天 ) 山", "OR", [1, 2, 3, 5, 8, 21]),
+        ("((春天", "OR", SPRING),
+        (")(", "OR", []),
+        ("春天 AND 小草 OR", "OR", [2, 3]),
+        ("AND OR", "OR", []),
+        ("", "OR", []),
+    ],
+)
+def test_evaluate_query(query, default_operator, expected):
+    tree, _ = parse_query(query, STOPWORDS, default_operator)
+    assert evaluate_query(tree, POSTINGS) == expected
+
+
+@pytest.mark.parametrize(
+    "query, expected_words",
+    [
+        ("春天 小草", ["春天", "小草"]),
+        ("+春天 小草", ["春天", "小草"]),  # 可选词只参与打分
+        ("春天 -小草", ["春天"]),
+        ("春天 NOT (小草 OR 山)", ["春天"]),
+        ("春天 +的 春天", ["春天", "春天"]),  # 重复的词重复计分
+        ("NOT 春天", []),
+    ],
+)
+def test_positive_words(query, expected_words):
+    assert parse_query(query, STOPWORDS)[1] == expected_words
+
+
+def test_unknown_default_operator():
+    with pytest.raises(ValueError):
+        parse_query("春天", STOPWORDS, "XOR")
+
+
+LONG = list(range(129))
+
+
+@pytest.mark.parametrize(
+    "lists, expected",
+    [
+        ([], []),
+        ([[], LONG], []),
+        ([[1], [1]], [1]),
+        ([[0], LONG], [0]),
+        ([[128], LONG], [128]),  # 跳跃查找越过表尾前的最后一个元素
+        ([[129], LONG], []),
+        ([[-1, 129], LONG], []),
+        ([[1, 2, 3, 4, 7, 8, 15, 16, 31, 32, 63, 64, 127, 128], LONG], [1, 2, 3, 4, 7, 8, 15, 16, 31, 32, 63, 64, 127, 128]),
+        ([[5, 64, 200], LONG, [64, 65]], [64]),
+        ([[2, 4, 6], [1, 3, 5]], []),
+    ],
+)
+def test_intersect_postings(lists, expected):
+    assert intersect_postings(lists) == expected
+
+
+@pytest.mark.parametrize(
+    "docs, excluded, expected",
+    [
+        ([], LONG, []),
+        ([1, 2, 3], [], [1, 2, 3]),
+        ([0, 128, 129], LONG, [129]),
+        ([1, 64, 65, 200], [64, 200], [1, 65]),
+        (LONG, [0, 1, 2, 4, 8, 16, 32, 64, 128], [d for d in LONG if d not in (0, 1, 2, 4, 8, 16, 32, 64, 128)]),
+    ],
+)
+def test_subtract_postings(docs, excluded, expected):
+    assert subtract_postings(docs, excluded) == expected
+
+
+def test_postings_match_set_operations():
+    rng = random.Random(0)
+    for _ in range(200):
+        lists = [sorted(rng.sample(range(300), rng.randint(0, 120))) for _ in range(rng.randint(1, 4))]
+        assert intersect_postings(lists) == sorted(set.intersection(*map(set, lists)))
+        assert subtract_postings(lists[0], lists[-1]) == sorted(set(lists[0]) - set(lists[-1]))
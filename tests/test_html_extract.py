@@ -0,0 +1,35 @@
+from bs4 import BeautifulSoup
+
+from html_extract import detect_encoding, extract_document
+
+
+def test_utf8_file_with_gb2312_meta(tmp_path):
+    html = '<html><head><meta charset="gb2312"><title>凶</title></head><body><p>凶恶</p></body></html>'
+    path = tmp_path / "doc.html"
+    path.write_bytes(html.encode("utf-8"))
+    document = extract_document(path)
+    assert document.encoding == "utf-8"
+    assert document.title == "凶"
+    assert document.paragraphs == ["凶恶"]
+
+
+def test_gbk_file_honours_meta_or_falls_back():
+    html = '<html><head><meta charset="gb2312"></head><body><p>凶恶</p></body></html>'
+    assert detect_encoding(html.encode("gb2312")) == "gb2312"
+    assert detect_encoding(html.replace("gb2312", "utf-8").encode("gbk")) == "gbk"
+
+
+def test_paragraph_text_matches_bs4(tmp_path):
+    html = (
+        "<html><head><title>a<!--x-->b</title></head><body>"
+        "<h3>h<script>var y</script>3</h3>"
+        "<p>a<b>b<script>x=1</script></b><!-- 注释 -->c<?pi data?><style>p{}</style> d </p>"
+        "</body></html>"
+    )
+    path = tmp_path / "doc.html"
+    path.write_text(html, encoding="utf-8")
+    document = extract_document(path)
+    soup = BeautifulSoup(html, "lxml")
+    assert document.title == soup.title.get_text(strip=True) == "ab"
+    assert document.headings == [soup.h3.get_text(strip=True)] == ["h3"]
+    assert document.paragraphs == [soup.p.get_text(strip=True)] == ["abcd"]
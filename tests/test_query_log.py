@@ -0,0 +1,41 @@
+import json
+import time
+
+from online_textbook.query_log import QueryLogger, aggregate, read_log
+
+
+def test_popular_queries_are_keyed_by_corpus(tmp_path):
+    records = [
+        {"type": "search", "query": "春天", "corpus": "grade2", "tokens": ["春天"]},
+        {"type": "search", "query": "春天 ", "corpus": "grade2", "tokens": ["春天"]},
+        {"type": "search", "query": "春天", "corpus": "grade3", "tokens": ["春天"]},
+        {"type": "search", "query": "春天", "tokens": ["春天"]},
+    ]
+    path = tmp_path / "queries.jsonl"
+    path.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records), encoding="utf-8")
+
+    queries = aggregate([path])["queries"]
+    assert queries[0] == {"corpus": "grade2", "query": "春天", "count": 2}
+    assert {(q["corpus"], q["count"]) for q in queries[1:]} == {("grade3", 1), (None, 1)}
+
+
+def test_logger_flushes_without_close(tmp_path):
+    path = tmp_path / "logs" / "queries.jsonl"
+    logger = QueryLogger(path, flush_interval=0.05)
+    logger.log("search", query="春天")
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and not (path.exists() and path.read_text(encoding="utf-8")):
+        time.sleep(0.01)
+    records = list(read_log([path]))
+    assert [(r["type"], r["query"]) for r in records] == [("search", "春天")]
+    logger.close()
+
+
+def test_close_drains_the_queue(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    logger = QueryLogger(path, flush_interval=5)
+    for i in range(2000):
+        logger.log("doc", corpus="grade2", doc_id=i)
+    logger.close()
+    assert [r["doc_id"] for r in read_log([path])] == list(range(2000))
+    assert logger.dropped == 0
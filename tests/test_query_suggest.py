@@ -0,0 +1,66 @@
+import pickle
+
+import pytest
+
+import query_suggest
+from query_suggest import SuggestIndex, build_suggest_index, dictionary_readings, load_suggest_index
+from search_engine import BASE_DIR, load_stopwords, resident_indexes, tokenize
+
+
+@pytest.fixture(scope="module")
+def pinyin_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("shared") / "pinyin_readings.pkl")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(query_suggest, "DEFAULT_PINYIN_PATH", path)
+        yield path
+
+
+@pytest.fixture(scope="module")
+def suggest_paths(tmp_path_factory, pinyin_path):
+    paths = []
+    for name in ("grade2", "grade3"):
+        path = str(tmp_path_factory.mktemp(name) / "suggest_index.pkl")
+        build_suggest_index(str(BASE_DIR / "bm25_index.pkl"), BASE_DIR / "htmls", path, pinyin_path)
+        paths.append(path)
+    return paths
+
+
+def test_index_stores_only_textbook_readings(suggest_paths):
+    with open(suggest_paths[0], "rb") as f:
+        data = pickle.load(f)
+    assert "readings" not in data
+    assert 0 < len(data["textbook_readings"]) < 1000
+
+
+def test_dictionary_readings_are_shared(suggest_paths):
+    first, second = (load_suggest_index(path) for path in suggest_paths)
+    assert first.readings.maps[1] is second.readings.maps[1] is dictionary_readings()
+    assert {("suggest", path) for path in suggest_paths} <= set(resident_indexes())
+
+
+def test_processes_load_the_shared_pinyin_table(suggest_paths, pinyin_path, monkeypatch):
+    with open(pinyin_path, "rb") as f:
+        shared = pickle.load(f)
+
+    def regenerate():
+        raise AssertionError("检索进程不应重新生成拼音表")
+
+    monkeypatch.setattr(query_suggest, "_generate_dictionary_readings", regenerate)
+    monkeypatch.setattr(query_suggest, "_DICTIONARY_CACHE", {})
+    first, second = (SuggestIndex(path) for path in suggest_paths)
+    assert first.readings.maps[1] is second.readings.maps[1] == shared
+
+
+def test_missing_pinyin_table_keeps_textbook_readings(suggest_paths, tmp_path, monkeypatch):
+    monkeypatch.setattr(query_suggest, "_DICTIONARY_CACHE", {})
+    suggest_index = SuggestIndex(suggest_paths[0], str(tmp_path / "missing.pkl"))
+    assert suggest_index.readings.maps[1] == {}
+    assert suggest_index.readings["凶"] == ("xiong",)
+
+
+def test_homophone_and_pinyin_suggestions(suggest_paths):
+    suggest_index = load_suggest_index(suggest_paths[0])
+    stopwords = load_stopwords()
+    for query in ("春田", "chuntian"):
+        suggestions = suggest_index.suggest(query, tokenize(query, stopwords))
+        assert suggestions and suggestions[0].query == "春天"
@@ -0,0 +1,55 @@
+import pytest
+
+from search_backends import open_backend
+from search_engine import (
+    BASE_DIR,
+    DEFAULT_INDEX_MEMORY_BUDGET,
+    build_sharded_index,
+    resident_indexes,
+    set_index_memory_budget,
+)
+from semantic_index import build_semantic_index, load_semantic_index
+
+
+@pytest.fixture
+def tiny_budget():
+    set_index_memory_budget(1)
+    yield
+    set_index_memory_budget(DEFAULT_INDEX_MEMORY_BUDGET)
+
+
+@pytest.fixture(scope="module")
+def shard_dirs(tmp_path_factory):
+    dirs = []
+    for i in range(2):
+        path = tmp_path_factory.mktemp(f"corpus{i}")
+        build_sharded_index(start=1, end=20, num_shards=2, save_dir=path)
+        dirs.append(str(path))
+    return dirs
+
+
+def test_semantic_index_counts_against_budget(tmp_path):
+    path = str(tmp_path / "semantic_index.npz")
+    build_semantic_index(str(BASE_DIR / "bm25_index.pkl"), path, 16)
+    semantic_index = load_semantic_index(path)
+    assert resident_indexes()[("semantic", path)] == semantic_index.memory_bytes() > 0
+    assert load_semantic_index(path) is semantic_index
+
+
+def test_evicted_sharded_backend_is_closed(shard_dirs, tiny_budget):
+    first = open_backend("sharded", shard_dirs[0])
+    hits = first.search("春天")
+    second = open_backend("sharded", shard_dirs[1])
+
+    resident = resident_indexes()
+    assert ("backend", ("sharded", shard_dirs[0], None)) not in resident
+    assert ("backend", ("sharded", shard_dirs[1], None)) in resident
+    for executor in first.retriever._executors:
+        with pytest.raises(RuntimeError):
+            executor.submit(int)  # 已关闭的执行器拒绝新任务
+
+    # 淘汰时仍持有引用的请求照常完成；再次打开得到新的后端
+    assert first.search("春天") == hits
+    assert open_backend("sharded", shard_dirs[0]) is not first
+    first.retriever.close()
+    second.retriever.close()
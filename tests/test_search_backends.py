@@ -0,0 +1,54 @@
+import pytest
+
+from search_backends import BACKENDS, _fts_expression
+from search_engine import evaluate_query, load_index
+
+
+BOOLEAN_QUERIES = [
+    "春天",
+    "春天 小草",
+    "春天 AND 小草",
+    "春天 -小草",
+    "春天 AND NOT 小草",
+    "春天 AND (NOT 小草)",
+    "春天 AND (-小草 -山)",
+    "+春天 小草",
+    "春天 +的",
+    "(山 OR 水) -春天",
+    "春天 NOT (小草 OR 山)",
+    "春天 OR (NOT 小草)",
+    "NOT 春天",
+]
+
+
+@pytest.fixture(scope="module")
+def backends(tmp_path_factory):
+    root = tmp_path_factory.mktemp("backends")
+    locations = {"bm25": root / "bm25_index.pkl", "sharded": root / "shards", "sqlite": root / "index.sqlite3"}
+    opened = {}
+    for name, location in locations.items():
+        BACKENDS[name].build(str(location))
+        opened[name] = BACKENDS[name].open(str(location))
+    yield opened
+    for backend in opened.values():
+        backend.close()
+
+
+@pytest.mark.parametrize("default_operator", ["OR", "AND"])
+@pytest.mark.parametrize("query", BOOLEAN_QUERIES)
+def test_backends_agree_on_boolean_queries(backends, query, default_operator):
+    matched = {
+        name: sorted(doc_id for doc_id, _ in backend.search(query, top_n=200, default_operator=default_operator))
+        for name, backend in backends.items()
+    }
+    assert matched["sharded"] == matched["bm25"]
+    assert matched["sqlite"] == matched["bm25"]
+
+
+def test_fts_folds_nested_exclusions(backends):
+    # 手工构造、未经 parse_query 规整的语法树
+    tree = ("and", [("term", "春天"), ("and", [("not", ("term", "小草")), ("not", ("term", "山"))])])
+    assert _fts_expression(tree) == '((("春天") NOT "小草") NOT "山")'
+    postings = load_index(backends["bm25"].location)["sorted_postings"]
+    expected = sorted(set(postings["春天"]) - set(postings["小草"]) - set(postings["山"]))
+    assert evaluate_query(tree, postings) == expected
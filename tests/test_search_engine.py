@@ -0,0 +1,55 @@
+import search_engine
+from search_engine import BASE_DIR, _env_weight, collect_index_data, load_index, retrieve
+
+
+def test_title_weight_accepts_fractional_values(monkeypatch):
+    monkeypatch.setenv("TITLE_WEIGHT", "7.5")
+    assert _env_weight("TITLE_WEIGHT", "20") == 7.5
+    monkeypatch.setenv("TITLE_WEIGHT", "20.0")
+    assert _env_weight("TITLE_WEIGHT", "20") == 20
+    assert isinstance(_env_weight("TITLE_WEIGHT", "20"), int)  # 整数权重的索引仍存 int 词频
+
+
+def test_fractional_title_weight_builds_index():
+    index_data = collect_index_data(start=1, end=3, title_weight=7.5)
+    assert index_data["total_docs"] == 3
+    assert any(isinstance(tf, float) for postings in index_data["inverted_index"].values() for tf in postings.values())
+
+
+INDEX_PATH = str(BASE_DIR / "bm25_index.pkl")
+
+
+def _common_words(count):
+    word_df = load_index(INDEX_PATH)["word_df"]
+    return sorted(word_df, key=lambda w: (-word_df[w], w))[:count]
+
+
+def test_max_candidates_keeps_rarest_word_documents():
+    query = "春天 小草"
+    full_stats, stats = {}, {}
+    full = retrieve(query, index_path=INDEX_PATH, top_n=200, stats=full_stats)
+    assert not full_stats["partial"] and full_stats["candidates"] > 3
+
+    hits = retrieve(query, index_path=INDEX_PATH, top_n=200, stats=stats, max_candidates=3)
+    assert stats["partial"] and stats["scored"] == 3
+    assert set(hits) <= set(full)
+    index_data = load_index(INDEX_PATH)
+    rarest = min(("春天", "小草"), key=index_data["word_df"].get)
+    assert {doc_id for doc_id, _ in hits} <= set(index_data["sorted_postings"][rarest])
+
+    stats = {}
+    assert retrieve(query, index_path=INDEX_PATH, top_n=200, stats=stats, max_candidates=1000) == full
+    assert not stats["partial"]
+
+
+def test_time_budget_stops_scoring_early(monkeypatch):
+    monkeypatch.setattr(search_engine, "DEADLINE_CHECK_INTERVAL", 4)
+    query = " ".join(_common_words(3))
+    stats = {}
+    hits = retrieve(query, index_path=INDEX_PATH, top_n=200, stats=stats, time_budget=0)
+    assert stats["partial"] and stats["scored"] == 4 < stats["candidates"]
+    assert len(hits) <= 4
+
+    stats = {}
+    retrieve(query, index_path=INDEX_PATH, top_n=200, stats=stats, time_budget=60)
+    assert not stats["partial"] and stats["scored"] == stats["candidates"]
@@ -0,0 +1,38 @@
+import pytest
+
+from search_engine import BASE_DIR, load_index
+from semantic_index import build_semantic_index, hybrid_retrieve
+
+
+INDEX_PATH = str(BASE_DIR / "bm25_index.pkl")
+
+
+@pytest.fixture(scope="module")
+def semantic_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("semantic") / "semantic_index.npz")
+    build_semantic_index(INDEX_PATH, path, 64)
+    return path
+
+
+def _hybrid(query, semantic_path):
+    return [doc_id for doc_id, _ in hybrid_retrieve(query, index_path=INDEX_PATH, semantic_path=semantic_path)]
+
+
+def test_not_clause_excludes_vector_hits(semantic_path):
+    excluded = set(load_index(INDEX_PATH)["sorted_postings"]["小草"])
+    hits = _hybrid("春天 -小草", semantic_path)
+    assert hits
+    assert not excluded & set(hits)
+
+
+def test_conjunction_limits_vector_hits(semantic_path):
+    postings = load_index(INDEX_PATH)["sorted_postings"]
+    both = set(postings["春天"]) & set(postings["小草"])
+    assert set(_hybrid("春天 AND 小草", semantic_path)) <= both
+    assert set(_hybrid("+春天 小草", semantic_path)) <= set(postings["春天"])
+
+
+def test_disjunction_keeps_vector_recall(semantic_path):
+    postings = load_index(INDEX_PATH)["sorted_postings"]
+    lexical = set(postings["春天"]) | set(postings["小草"])
+    assert set(_hybrid("春天 小草", semantic_path)) - lexical
@@ -0,0 +1,95 @@
+import json
+import os
+from concurrent.futures import wait
+
+import pytest
+
+from search_engine import bm25_idf, build_bm25_index, build_sharded_index, load_stopwords, parse_query, retrieve
+from sharded_index import ShardedRetriever, load_shard, score_shard
+
+
+QUERIES = ["春天", "凶", "礼貌", "小草 春天", "山 水", "许慎 说文解字"]
+BOOLEAN_QUERIES = ["NOT 春天", "春天 -小草", "春天 AND 小草", "+春天 小草", "(山 OR 水) -春天", "春天 NOT (小草 OR 山)"]
+
+
+@pytest.fixture(scope="module")
+def shards_dir(tmp_path_factory):
+    path = tmp_path_factory.mktemp("shards")
+    build_sharded_index(num_shards=3, save_dir=path)
+    return path
+
+
+def test_each_worker_holds_exactly_one_shard(shards_dir):
+    with ShardedRetriever(shards_dir) as retriever:
+        for _ in range(50):
+            for query in QUERIES:
+                retriever.retrieve(query)
+        resident = retriever.worker_shards()
+
+    assert resident == [[str(shards_dir / f"shard-{i}.pkl")] for i in range(3)]
+
+
+@pytest.fixture(scope="module")
+def index_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("single") / "bm25_index.pkl"
+    build_bm25_index(save_path=path)
+    return str(path)
+
+
+def test_results_match_single_index(shards_dir, index_path):
+    with ShardedRetriever(shards_dir) as retriever:
+        for query in QUERIES:
+            assert retriever.retrieve(query) == retrieve(query, index_path=index_path)
+
+
+def test_boolean_queries_match_single_index(shards_dir, index_path):
+    with ShardedRetriever(shards_dir) as retriever:
+        assert retriever.retrieve("NOT 春天") == []
+        for query in BOOLEAN_QUERIES:
+            assert retriever.retrieve(query, top_n=200) == retrieve(query, index_path=index_path, top_n=200)
+        for query in QUERIES:
+            expected = retrieve(query, index_path=index_path, default_operator="AND")
+            assert retriever.retrieve(query, default_operator="AND") == expected
+
+
+def test_remote_shard_evaluates_json_tree(shards_dir):
+    # 远程分片收到的语法树经过 JSON 往返，元组变为列表
+    with ShardedRetriever(shards_dir) as retriever:
+        global_stats = retriever.global_stats
+        query_tree, query_words = parse_query("春天 -小草", load_stopwords(None))
+        idf = {w: bm25_idf(global_stats["word_df"][w], global_stats["total_docs"]) for w in query_words}
+        tree = json.loads(json.dumps(query_tree))
+        for path in retriever.shard_paths:
+            shard = load_shard(path)
+            hits, _ = score_shard(shard, query_words, idf, global_stats["avg_doc_length"], 100, query_tree=tree)
+            assert not {doc_id for doc_id, _ in hits} & set(shard["inverted_index"].get("小草", {}))
+
+
+def test_missing_tree_matches_nothing(shards_dir):
+    with ShardedRetriever(shards_dir) as retriever:
+        shard = load_shard(retriever.shard_paths[0])
+        assert score_shard(shard, ["春天"], {"春天": 1.0}, 10.0, 10, query_tree=None) == ([], 0)
+
+
+def test_candidates_are_counted(shards_dir, index_path):
+    with ShardedRetriever(shards_dir) as retriever:
+        for query in QUERIES + BOOLEAN_QUERIES:
+            sharded_stats, single_stats = {}, {}
+            retriever.retrieve(query, stats=sharded_stats)
+            retrieve(query, index_path=index_path, stats=single_stats)
+            assert sharded_stats["candidates"] == single_stats["candidates"]
+
+
+def test_crashed_worker_restarts_alone(shards_dir):
+    with ShardedRetriever(shards_dir) as retriever:
+        expected = retriever.retrieve("春天")
+        pids = [executor.submit(os.getpid).result() for executor in retriever._executors]
+        crashed = retriever._executors[1]
+        wait([crashed.submit(os._exit, 1)])
+
+        assert retriever.retrieve("春天") == expected  # 提交时发现进程池已损坏并重启
+
+        new_pids = [executor.submit(os.getpid).result() for executor in retriever._executors]
+        assert new_pids[0] == pids[0] and new_pids[2] == pids[2]
+        assert new_pids[1] != pids[1]
+        assert retriever._executors[1] is not crashed
@@ -0,0 +1,59 @@
+import pytest
+
+from search_engine import BASE_DIR, load_index
+from static_export import build_client_index, shard_of
+
+
+def _decode(meta, shards):
+    """按 static/js/bm25.js 的方式还原倒排表与文档频率"""
+    inverted_index, word_df = {}, {}
+    for shard in shards:
+        for word, encoded in shard.items():
+            word_df[word] = encoded[0]
+            postings, pos = {}, 0
+            for i in range(1, len(encoded), 2):
+                pos += encoded[i]
+                postings[meta["doc_ids"][pos]] = encoded[i + 1]
+            inverted_index[word] = postings
+    return inverted_index, word_df
+
+
+def test_delta_encoding_round_trips():
+    index_data = {
+        "inverted_index": {"春天": {3: 20, 1: 1, 42: 2}, "𠀀": {42: 1}, "凶": {7: 21}},
+        "word_df": {"春天": 3, "𠀀": 1, "凶": 1},
+        "doc_lengths": {1: 5, 3: 8, 7: 2, 42: 9},
+        "total_docs": 4,
+        "avg_doc_length": 6.0,
+    }
+    meta, shards = build_client_index(index_data, titles={3: "春"}, shard_count=4)
+    assert _decode(meta, shards) == (index_data["inverted_index"], index_data["word_df"])
+    assert meta["doc_ids"] == [1, 3, 7, 42]
+    assert meta["titles"] == ["文档1", "春", "文档7", "文档42"]
+    for i, shard in enumerate(shards):
+        assert all(shard_of(word, 4) == i for word in shard)
+
+
+def test_real_index_round_trips():
+    index_data = load_index(str(BASE_DIR / "bm25_index.pkl"))
+    meta, shards = build_client_index(index_data, shard_count=8)
+    assert _decode(meta, shards) == (index_data["inverted_index"], index_data["word_df"])
+
+
+# 期望值由 static/js/bm25.js 的 shardOf 在 Node 中算出：两边必须逐位一致
+@pytest.mark.parametrize(
+    "term, shard_count, expected",
+    [
+        ("a", 8, 1),
+        ("春", 8, 5),
+        ("春天", 8, 4),
+        ("春天", 2**32, 833444),
+        ("𠀀", 8, 0),  # 非 BMP 字符按码点而不是 UTF-16 代理对计算
+        ("𠀀", 2**32, 131072),
+        ("𪚥龘", 8, 3),
+        ("𪚥龘", 2**32, 5426579),
+        ("𠀀" * 7, 2**32, 1195507712),  # 超过 32 位时回绕
+    ],
+)
+def test_shard_of_matches_javascript(term, shard_count, expected):
+    assert shard_of(term, shard_count) == expected
@@ -0,0 +1,86 @@
+import pickle
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import search_engine
+from search_engine import BASE_DIR, load_index, reload_index, retrieve, tokenize, load_stopwords
+
+
+THREADS = 16
+QUERIES = ["春天", "凶", "礼貌 OR 凶恶", "春天 -小草", "山 AND 水"]
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    # 新路径：缓存中没有该索引，模拟冷启动
+    path = tmp_path / "bm25_index.pkl"
+    shutil.copy(BASE_DIR / "bm25_index.pkl", path)
+    tokenize("预热", load_stopwords())  # 分词器不在本测试的检查范围内
+    return str(path)
+
+
+@pytest.fixture
+def index_loads(monkeypatch, index_path):
+    """记录索引文件被反序列化的次数，并放慢反序列化以扩大竞争窗口"""
+    loads = []
+    real_load = pickle.load
+
+    def counting_load(f, *args, **kwargs):
+        if Path(getattr(f, "name", "")) == Path(index_path):
+            loads.append(threading.get_ident())
+            time.sleep(0.05)
+        return real_load(f, *args, **kwargs)
+
+    monkeypatch.setattr(search_engine.pickle, "load", counting_load)
+    return loads
+
+
+def test_concurrent_cold_start_loads_index_once(index_path, index_loads):
+    barrier = threading.Barrier(THREADS)
+
+    def search(query):
+        barrier.wait()
+        return retrieve(query, index_path=index_path)
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        results = list(pool.map(search, [QUERIES[i % len(QUERIES)] for i in range(THREADS)]))
+
+    assert len(index_loads) == 1
+    for i, result in enumerate(results):
+        assert result == retrieve(QUERIES[i % len(QUERIES)], index_path=index_path)
+    assert len(index_loads) == 1
+
+
+def test_reload_during_queries_keeps_results_identical(index_path, index_loads):
+    expected = {query: retrieve(query, index_path=index_path) for query in QUERIES}
+    before = load_index(index_path)
+    stop = threading.Event()
+
+    def search_until_stopped():
+        mismatches = 0
+        while not stop.is_set():
+            for query in QUERIES:
+                mismatches += retrieve(query, index_path=index_path) != expected[query]
+            time.sleep(0.001)  # 让出 GIL，避免热更新线程长时间拿不到执行机会
+        return mismatches
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        futures = [pool.submit(search_until_stopped) for _ in range(THREADS)]
+        for _ in range(3):
+            reload_index(index_path)
+        stop.set()
+        assert sum(future.result() for future in futures) == 0
+
+    assert len(index_loads) == 4  # 冷启动一次 + 三次热更新
+    assert load_index(index_path) is not before
+
+
+def test_index_snapshot_is_read_only(index_path):
+    index_data = load_index(index_path)
+    with pytest.raises(TypeError):
+        index_data["total_docs"] = 0